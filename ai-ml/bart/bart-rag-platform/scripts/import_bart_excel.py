@@ -9,9 +9,15 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import hashlib
 import json
 import logging
-from sqlalchemy import create_engine
+import orjson
+import re
+import pandas as pd
+from sqlalchemy import create_engine, event, insert, text
 from sqlalchemy.orm import sessionmaker
 
 from src.bid_tool.services.excel_importer import BARTExcelImporter
@@ -22,14 +28,70 @@ from src.bid_tool.models.project import Base
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Formula converter used by conversion worker processes
+_formula_engine = ExcelFormulaEngine()
+
+# Formula classifiers, matched case-insensitively in one pass over the
+# formula text so no uppercased copy is needed
+FORMULA_TYPE_PATTERN = re.compile(
+    r'(?P<vlookup>VLOOKUP)|(?P<conditional>IF)|(?P<calculation>SUM|[+\-])',
+    re.IGNORECASE
+)
+
 
 def setup_database():
     """Create database and tables"""
-    engine = create_engine('sqlite:///bart_bid_tool.db')
-    Base.metadata.create_all(engine)
+    engine = create_engine(
+        'sqlite:///bart_bid_tool.db',
+        json_serializer=_json_dumps
+    )
+    event.listen(engine, 'connect', _configure_sqlite)
+    
+    # Skip create_all's per-table introspection when the schema is unchanged
+    schema_version = _schema_fingerprint()
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS _meta (key TEXT PRIMARY KEY, value TEXT)"))
+        current_version = conn.execute(
+            text("SELECT value FROM _meta WHERE key = 'schema_version'")
+        ).scalar()
+        
+        if current_version != schema_version:
+            logger.info("Schema changed, creating tables")
+            Base.metadata.create_all(conn)
+            conn.execute(
+                text("INSERT OR REPLACE INTO _meta (key, value) VALUES ('schema_version', :version)"),
+                {'version': schema_version}
+            )
     return engine
 
 
+def _schema_fingerprint() -> str:
+    """Hash of every table and column definition in Base.metadata"""
+    digest = hashlib.sha256()
+    for table_name in sorted(Base.metadata.tables):
+        digest.update(table_name.encode())
+        for column in Base.metadata.tables[table_name].columns:
+            digest.update(f"{column.name}:{column.type!r}:{column.nullable}".encode())
+    return digest.hexdigest()
+
+
+def _json_dumps(value) -> str:
+    """Serialize JSON columns with orjson; also handles Excel dates"""
+    return orjson.dumps(value).decode()
+
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    """Tune SQLite for bulk import: WAL journal, one fsync per commit"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-262144")  # 256MB page cache
+    cursor.execute("PRAGMA mmap_size=268435456")  # 256MB memory map
+    cursor.execute("PRAGMA journal_size_limit=67108864")  # Trim WAL to 64MB
+    cursor.close()
+
+
 def import_excel_to_database(excel_path: str):
     """Import Excel workbook into database"""
     
@@ -46,58 +108,53 @@ def import_excel_to_database(excel_path: str):
     logger.info(f"Found {len(excel_data['formulas'])} formulas")
     logger.info(f"Found {len(excel_data['lookups'])} lookup tables")
     
-    # Store lookup tables
-    for table_name, table_data in excel_data['lookups'].items():
-        lookup = LookupTable(
-            table_name=table_name,
-            excel_sheet=table_data.get('sheet', ''),
-            excel_range=table_data.get('range', ''),
-            headers=table_data.get('headers', []),
-            data_rows=table_data.get('data', []),
-            uses_composite_key=table_data.get('composite_key') is not None,
-            composite_key_format=table_data.get('composite_key', '')
-        )
-        session.add(lookup)
-    
-    # Convert and store formulas
-    formula_engine = ExcelFormulaEngine()
-    
-    for formula_key, formula_data in excel_data['formulas'].items():
-        try:
-            # Convert Excel formula to Python
-            python_code = formula_engine.convert_formula_to_python(
-                formula_data['formula']
-            )
-            
-            # Store formula definition
-            formula_def = FormulaDefinition(
-                formula_name=formula_key,
-                excel_reference=formula_data['cell'],
-                excel_sheet=formula_data['sheet'],
-                formula_type=_identify_formula_type(formula_data['formula']),
-                complexity_score=formula_data.get('complexity', 0),
-                python_code=python_code,
-                dependencies=formula_data.get('dependencies', [])
+    # Rows are inserted as plain dicts through executemany INSERTs;
+    # no ORM objects are built for the imported data
+    with session.no_autoflush:
+        # Store lookup tables
+        lookups = [
+            {
+                'table_name': table_name,
+                'excel_sheet': table_data.get('sheet', ''),
+                'excel_range': table_data.get('range', ''),
+                'headers': table_data.get('headers', []),
+                'data_rows': table_data.get('data', []),
+                'uses_composite_key': table_data.get('composite_key') is not None,
+                'composite_key_format': table_data.get('composite_key', '')
+            }
+            for table_name, table_data in excel_data['lookups'].items()
+        ]
+        _insert_rows(session, LookupTable, lookups)
+        
+        # Convert each distinct formula once, fanned out across CPU cores
+        formula_texts = list(dict.fromkeys(
+            formula_data['formula']
+            for formula_data in excel_data['formulas'].values()
+            if 'formula' in formula_data
+        ))
+        with ProcessPoolExecutor() as pool:
+            conversions = dict(zip(
+                formula_texts,
+                pool.map(_convert_formula, formula_texts, chunksize=64)
+            ))
+        
+        # Store formulas
+        formulas = [
+            formula_row
+            for formula_row in (
+                _build_formula_row(formula_key, formula_data, conversions)
+                for formula_key, formula_data in excel_data['formulas'].items()
             )
-            session.add(formula_def)
-            
-        except Exception as e:
-            logger.error(f"Failed to convert formula {formula_key}: {e}")
-    
-    # Import pricing rules from Data2
-    if 'Data2' in excel_data['data']:
-        data2 = excel_data['data']['Data2']
-        if 'lookup_tables' in data2:
-            for row in data2['lookup_tables'].get('data', []):
-                if len(row) >= 4:
-                    rule = PricingRule(
-                        rule_key=f"{row[0]}_{row[1]}" if len(row) > 1 else str(row[0]),
-                        rule_type='material',
-                        item_description=str(row[0]),
-                        base_price=float(row[3]) if row[3] else 0,
-                        source_table='Data2'
-                    )
-                    session.add(rule)
+            if formula_row is not None
+        ]
+        _insert_rows(session, FormulaDefinition, formulas)
+        
+        # Import pricing rules from Data2
+        if 'Data2' in excel_data['data']:
+            data2 = excel_data['data']['Data2']
+            if 'lookup_tables' in data2:
+                rules = _build_pricing_rules(data2['lookup_tables'].get('data', []))
+                _insert_rows(session, PricingRule, rules)
     
     # Commit all changes
     session.commit()
@@ -112,21 +169,89 @@ def import_excel_to_database(excel_path: str):
         'metadata': excel_data['metadata']
     }
     
-    with open('import_summary.json', 'w') as f:
-        json.dump(summary, f, indent=2)
+    with open('import_summary.json', 'wb') as f:
+        f.write(orjson.dumps(summary, option=orjson.OPT_INDENT_2))
     
     return summary
 
 
+def _convert_formula(formula: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Convert an Excel formula to Python source.
+    Runs in worker processes, so failures are returned instead of raised.
+    """
+    try:
+        # Convert Excel formula to Python
+        return _formula_engine.convert_formula_to_python(formula), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _insert_rows(session, model, rows: List[dict]):
+    """Insert plain row dicts for a model as one executemany statement"""
+    if rows:
+        session.execute(insert(model), rows)
+
+
+def _build_formula_row(formula_key: str, formula_data: dict,
+                       conversions: Dict[str, tuple]) -> Optional[dict]:
+    """Build a formula definition row, returning None if conversion failed"""
+    try:
+        python_code, error = conversions[formula_data['formula']]
+        if error is not None:
+            raise ValueError(error)
+            
+        return {
+            'formula_name': formula_key,
+            'excel_reference': formula_data['cell'],
+            'excel_sheet': formula_data['sheet'],
+            'formula_type': _identify_formula_type(formula_data['formula']),
+            'complexity_score': formula_data.get('complexity', 0),
+            'python_code': python_code,
+            'dependencies': formula_data.get('dependencies', [])
+        }
+        
+    except Exception as e:
+        logger.error(f"Failed to convert formula {formula_key}: {e}")
+        return None
+
+
+def _build_pricing_rules(rows: List[list]) -> List[dict]:
+    """Build Data2 material pricing rules, coercing all prices in one pass"""
+    rows = [row for row in rows if len(row) >= 4]
+    if not rows:
+        return []
+        
+    # Blank or non-numeric prices become 0
+    prices = pd.to_numeric(
+        pd.Series([row[3] for row in rows], dtype=object), errors='coerce'
+    ).fillna(0.0).tolist()
+    
+    return [
+        {
+            'rule_key': f"{row[0]}_{row[1]}",
+            'rule_type': 'material',
+            'item_description': str(row[0]),
+            'base_price': price,
+            'source_table': 'Data2'
+        }
+        for row, price in zip(rows, prices)
+    ]
+
+
 def _identify_formula_type(formula: str) -> str:
     """Identify the type of Excel formula"""
-    formula_upper = formula.upper()
+    found = set()
     
-    if 'VLOOKUP' in formula_upper:
-        return 'vlookup'
-    elif 'IF' in formula_upper:
+    # Single scan; VLOOKUP wins outright, otherwise the highest-priority hit
+    for match in FORMULA_TYPE_PATTERN.finditer(formula):
+        if match.lastgroup == 'vlookup':
+            return 'vlookup'
+        found.add(match.lastgroup)
+        
+    if 'conditional' in found:
         return 'conditional'
-    elif 'SUM' in formula_upper or '+' in formula or '-' in formula:
+    elif 'calculation' in found:
         return 'calculation'
     else:
         return 'other'
@@ -4,28 +4,82 @@ Handles project creation, updates, and bid calculations.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
-from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, undefer, undefer_group
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
+from functools import lru_cache
+import itertools
 import json
+import secrets
+import threading
+import time
+from types import MappingProxyType
+import numpy as np
 
 from ...api.dependencies import get_db
 from ..models.project import Project
 from ..models.measurement import Measurement, ExteriorMeasurement, InteriorMeasurement
 from ..models.calculation import Calculation
 from ..services.formula_engine import BARTCalculationEngine, ExcelFormulaEngine
-from ..services.excel_importer import BARTExcelImporter
+from .schemas import CreateProjectIn, MeasurementIn
 
-router = APIRouter(prefix="/api/v1/bid-tool/projects", tags=["bid-tool-projects"])
+router = APIRouter(
+    prefix="/api/v1/bid-tool/projects",
+    tags=["bid-tool-projects"],
+    default_response_class=ORJSONResponse
+)
 
-# Initialize calculation engine
-formula_engine = ExcelFormulaEngine()
-calc_engine = BARTCalculationEngine(formula_engine)
+# Uploads are copied in fixed-size chunks so large files never sit in memory
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Monotonic project number sequence, seeded from the clock in microseconds so
+# numbers stay unique across restarts of a process. Sequences of workers
+# started close together overlap, so each process also adds a random shard
+_PROJECT_SEQUENCE = itertools.count(time.time_ns() // 1000)
+_PROCESS_SHARD = secrets.randbits(32)
+
+# Checklists from Excel data, shared read-only across requests
+CHECKLISTS = MappingProxyType({
+    "initial_walk": (
+        {"task": "Call, leave voicemail, text, log call", "completed": False},
+        {"task": "Confirm client availability", "completed": False},
+        {"task": "Introduction - Smile, give business card", "completed": False},
+        {"task": "Walk property with homeowner", "completed": False},
+        {"task": "Take photos of all surfaces", "completed": False},
+        {"task": "Discuss color preferences", "completed": False},
+        {"task": "Check for lead paint (pre-1978)", "completed": False},
+        {"task": "Note special requirements", "completed": False}
+    ),
+    "exterior": (
+        {"task": "Protect landscaping", "completed": False},
+        {"task": "Pressure wash surfaces", "completed": False},
+        {"task": "Scrape loose paint", "completed": False},
+        {"task": "Prime bare wood", "completed": False},
+        {"task": "Caulk gaps and cracks", "completed": False},
+        {"task": "Apply first coat", "completed": False},
+        {"task": "Apply second coat", "completed": False},
+        {"task": "Clean up daily", "completed": False}
+    )
+})
+
+
+# Imports mutate the shared formula engine from threadpool workers
+_FORMULA_LOAD_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _engines() -> Tuple[ExcelFormulaEngine, BARTCalculationEngine]:
+    """Initialize the shared calculation engines on first use"""
+    formula_engine = ExcelFormulaEngine()
+    return formula_engine, BARTCalculationEngine(formula_engine)
 
 
 @router.post("/", response_model=dict)
 async def create_project(
-    project_data: dict,
+    project_data: CreateProjectIn,
     db: Session = Depends(get_db)
 ) -> dict:
     """
@@ -35,17 +89,17 @@ async def create_project(
     
     # Create project
     project = Project(
-        project_number=f"BART-{datetime.now().strftime('%Y%m%d-%H%M%S')}",
-        client_name=project_data["client_name"],
-        client_phone=project_data.get("client_phone"),
-        client_email=project_data.get("client_email"),
-        client_address=project_data.get("client_address"),
-        city=project_data.get("city"),
-        state=project_data.get("state"),
-        zip_code=project_data.get("zip_code"),
-        project_type=project_data["project_type"],
-        lead_paint_year=project_data.get("lead_paint_year"),
-        sales_rep=project_data.get("sales_rep", "Mobile User")
+        project_number=f"BART-{next(_PROJECT_SEQUENCE):012x}-{_PROCESS_SHARD:08x}",
+        client_name=project_data.client_name,
+        client_phone=project_data.client_phone,
+        client_email=project_data.client_email,
+        client_address=project_data.client_address,
+        city=project_data.city,
+        state=project_data.state,
+        zip_code=project_data.zip_code,
+        project_type=project_data.project_type,
+        lead_paint_year=project_data.lead_paint_year,
+        sales_rep=project_data.sales_rep
     )
     
     # Check lead paint risk
@@ -59,6 +113,25 @@ async def create_project(
     return project.to_dict()
 
 
+@router.get("/", response_model=list)
+async def list_projects(
+    status: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+) -> ORJSONResponse:
+    """List projects, newest first"""
+    
+    query = db.query(Project)
+    if status:
+        query = query.filter(Project.status == status)
+    projects = query.order_by(Project.created_at.desc(), Project.id.desc()).offset(offset).limit(limit).all()
+    
+    # Returned as a response so orjson serializes the DTOs directly,
+    # without FastAPI's jsonable_encoder building intermediate dicts
+    return ORJSONResponse([project.to_dto() for project in projects])
+
+
 @router.get("/{project_id}", response_model=dict)
 async def get_project(
     project_id: int,
@@ -66,15 +139,32 @@ async def get_project(
 ) -> dict:
     """Get project details with all measurements and calculations"""
     
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
+    # Fetch the project and its latest calculation in a single round trip
+    latest_calc_id = (
+        select(Calculation.id)
+        .where(Calculation.project_id == Project.id)
+        .order_by(Calculation.created_at.desc(), Calculation.id.desc())
+        .limit(1)
+        .correlate(Project)
+        .scalar_subquery()
+    )
+    row = db.query(Project, Calculation).outerjoin(
+        Calculation, Calculation.id == latest_calc_id
+    ).options(
+        undefer(Calculation.component_costs)
+    ).filter(Project.id == project_id).first()
+    
+    if not row:
         raise HTTPException(status_code=404, detail="Project not found")
+    project, latest_calc = row
     
     # Get all related data
     result = project.to_dict()
     
     # Add measurements
-    measurements = db.query(Measurement).filter(
+    measurements = db.query(Measurement).options(
+        undefer_group("data")
+    ).filter(
         Measurement.project_id == project_id
     ).all()
     
@@ -91,10 +181,6 @@ async def get_project(
     ]
     
     # Add latest calculation
-    latest_calc = db.query(Calculation).filter(
-        Calculation.project_id == project_id
-    ).order_by(Calculation.created_at.desc()).first()
-    
     if latest_calc:
         result["calculation"] = {
             "total": latest_calc.total_amount,
@@ -110,7 +196,7 @@ async def get_project(
 @router.post("/{project_id}/measurements", response_model=dict)
 async def add_measurement(
     project_id: int,
-    measurement_data: dict,
+    measurement_data: MeasurementIn,
     photos: Optional[List[UploadFile]] = File(None),
     db: Session = Depends(get_db)
 ) -> dict:
@@ -126,13 +212,13 @@ async def add_measurement(
     # Create base measurement
     measurement = Measurement(
         project_id=project_id,
-        measurement_type=measurement_data["type"],
-        area_name=measurement_data["area_name"],
-        measurement_data=measurement_data["data"],
-        notes=measurement_data.get("notes"),
-        latitude=measurement_data.get("latitude"),
-        longitude=measurement_data.get("longitude"),
-        created_by=measurement_data.get("created_by", "Mobile User")
+        measurement_type=measurement_data.measurement_type,
+        area_name=measurement_data.area_name,
+        measurement_data=measurement_data.data,
+        notes=measurement_data.notes,
+        latitude=measurement_data.latitude,
+        longitude=measurement_data.longitude,
+        created_by=measurement_data.created_by
     )
     
     # Handle photo uploads
@@ -148,13 +234,14 @@ async def add_measurement(
     db.flush()  # Get ID without committing
     
     # Add type-specific details
-    if measurement_data["type"] == "exterior":
+    if measurement_data.measurement_type == "exterior":
+        data = measurement_data.data
         exterior = ExteriorMeasurement(
             measurement_id=measurement.id,
-            siding_type=measurement_data["data"].get("siding_type"),
-            body_sqft=measurement_data["data"].get("body_sqft", 0),
-            trim_linear_ft=measurement_data["data"].get("trim_linear_ft", 0),
-            requires_pressure_wash=measurement_data["data"].get("requires_pressure_wash", True)
+            siding_type=data.get("siding_type"),
+            body_sqft=data.get("body_sqft", 0),
+            trim_linear_ft=data.get("trim_linear_ft", 0),
+            requires_pressure_wash=data.get("requires_pressure_wash", True)
         )
         db.add(exterior)
     
@@ -184,25 +271,29 @@ async def calculate_bid(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    # Get all measurements
-    measurements = db.query(Measurement).filter(
-        Measurement.project_id == project_id
-    ).all()
+    # Check for measurements without loading their JSON payloads
+    has_measurements = db.query(
+        db.query(Measurement).filter(Measurement.project_id == project_id).exists()
+    ).scalar()
     
-    if not measurements:
+    if not has_measurements:
         raise HTTPException(status_code=400, detail="No measurements found")
     
     # Prepare calculation based on project type
     if project.project_type == "exterior":
-        # Aggregate exterior measurements
-        total_body_sqft = 0
-        total_trim_ft = 0
+        # Pull exterior measurement columns straight out of the JSON payload
+        rows = db.query(
+            func.coalesce(Measurement.measurement_data["body_sqft"].as_float(), 0.0),
+            func.coalesce(Measurement.measurement_data["trim_linear_ft"].as_float(), 0.0)
+        ).filter(
+            Measurement.project_id == project_id,
+            Measurement.measurement_type == "exterior"
+        ).all()
         
-        for m in measurements:
-            if m.measurement_type == "exterior":
-                data = m.measurement_data
-                total_body_sqft += data.get("body_sqft", 0)
-                total_trim_ft += data.get("trim_linear_ft", 0)
+        # Aggregate exterior measurements as float64 columns
+        body_sqft, trim_ft = np.array(rows, dtype=np.float64).reshape(-1, 2).T
+        total_body_sqft = float(body_sqft.sum())
+        total_trim_ft = float(trim_ft.sum())
         
         # Calculate using formula engine
         calculation_input = {
@@ -213,6 +304,7 @@ async def calculate_bid(
             "margin2": options.get("margin2", 0.15) if options else 0.15
         }
         
+        _, calc_engine = _engines()
         result = calc_engine.calculate_exterior_bid(calculation_input)
         
     else:
@@ -257,34 +349,10 @@ async def get_checklist(
     Types: initial_walk, exterior, interior, warranty
     """
     
-    # Load checklist from Excel data
-    checklists = {
-        "initial_walk": [
-            {"task": "Call, leave voicemail, text, log call", "completed": False},
-            {"task": "Confirm client availability", "completed": False},
-            {"task": "Introduction - Smile, give business card", "completed": False},
-            {"task": "Walk property with homeowner", "completed": False},
-            {"task": "Take photos of all surfaces", "completed": False},
-            {"task": "Discuss color preferences", "completed": False},
-            {"task": "Check for lead paint (pre-1978)", "completed": False},
-            {"task": "Note special requirements", "completed": False}
-        ],
-        "exterior": [
-            {"task": "Protect landscaping", "completed": False},
-            {"task": "Pressure wash surfaces", "completed": False},
-            {"task": "Scrape loose paint", "completed": False},
-            {"task": "Prime bare wood", "completed": False},
-            {"task": "Caulk gaps and cracks", "completed": False},
-            {"task": "Apply first coat", "completed": False},
-            {"task": "Apply second coat", "completed": False},
-            {"task": "Clean up daily", "completed": False}
-        ]
-    }
-    
     return {
         "project_id": project_id,
         "checklist_type": checklist_type,
-        "items": checklists.get(checklist_type, [])
+        "items": CHECKLISTS.get(checklist_type, ())
     }
 
 
@@ -316,24 +384,18 @@ async def import_excel_data(
     """
     
     # Save uploaded file temporarily
-    import tempfile
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
-        content = await file.read()
-        tmp.write(content)
-        tmp_path = tmp.name
+    tmp_path = await _spool_upload(file, suffix='.xlsx')
     
-    # Import Excel data
+    # Import Excel data (openpyxl/pandas are only loaded for this endpoint)
+    from ..services.excel_importer import BARTExcelImporter
     importer = BARTExcelImporter(tmp_path)
-    import_data = importer.import_all()
     
-    # Load lookup tables into formula engine
-    formula_engine.load_lookup_tables(import_data['lookups'])
+    # Parsing is CPU-bound; keep it off the event loop
+    import_data = await run_in_threadpool(importer.import_all)
     
-    # Store formulas
-    for formula_key, formula_data in import_data['formulas'].items():
-        # Convert and store each formula
-        python_code = formula_engine.convert_formula_to_python(formula_data['formula'])
-        formula_engine.formulas[formula_key] = python_code
+    # Converting and JIT compiling every formula is CPU-bound as well
+    formula_engine, _ = _engines()
+    await run_in_threadpool(_load_formulas, formula_engine, import_data)
     
     return {
         "status": "success",
@@ -341,4 +403,30 @@ async def import_excel_data(
         "formulas_converted": len(import_data['formulas']),
         "lookups_loaded": len(import_data['lookups']),
         "metadata": import_data['metadata']
-    }
\ No newline at end of file
+    }
+
+
+def _load_formulas(formula_engine: ExcelFormulaEngine, import_data: Dict[str, Any]):
+    """Load imported lookup tables and formulas into the formula engine"""
+    with _FORMULA_LOAD_LOCK:
+        formula_engine.load_lookup_tables(import_data['lookups'])
+        
+        # Store formulas
+        for formula_key, formula_data in import_data['formulas'].items():
+            # Convert and store each formula, specialized to the loaded tables
+            python_code = formula_engine.convert_formula_to_python(
+                formula_data['formula'], lookup_tables=formula_engine.lookup_tables
+            )
+            formula_engine.register_formula(formula_key, python_code)
+            
+        # Compile up front so the first bid calculation does not pay for it
+        formula_engine.warmup()
+
+
+async def _spool_upload(upload: UploadFile, suffix: str = '') -> str:
+    """Stream an upload to a temporary file and return its path"""
+    import tempfile
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            tmp.write(chunk)
+        return tmp.name
\ No newline at end of file
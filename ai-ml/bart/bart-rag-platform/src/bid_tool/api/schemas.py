@@ -0,0 +1,36 @@
+"""
+Request schemas for BART bid tool API.
+Validated by pydantic before any handler touches the database.
+"""
+
+from typing import Optional, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class CreateProjectIn(BaseModel):
+    """New project/bid from the client intake form"""
+    model_config = ConfigDict(frozen=True)
+    
+    client_name: str
+    client_phone: Optional[str] = None
+    client_email: Optional[str] = None
+    client_address: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    zip_code: Optional[str] = None
+    project_type: str
+    lead_paint_year: Optional[int] = None  # Year built for lead paint check
+    sales_rep: str = "Mobile User"
+
+
+class MeasurementIn(BaseModel):
+    """Field measurement for one area of a project"""
+    model_config = ConfigDict(frozen=True, populate_by_name=True)
+    
+    measurement_type: str = Field(alias="type")  # exterior, interior, cabinet, etc.
+    area_name: str
+    data: Dict[str, Any]  # Type-specific values, mirrors the Excel cells
+    notes: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    created_by: str = "Mobile User"
\ No newline at end of file
@@ -3,16 +3,21 @@ Calculation models for BART bid tool.
 Maps to hidden Excel formula sheets and preserves all business logic.
 """
 
-from datetime import datetime
 from typing import Optional, Dict, Any, List
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, JSON, Float, ForeignKey, Text
-from sqlalchemy.orm import relationship
-from .project import Base
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, JSON, Float, ForeignKey, Text, Index, func
+from sqlalchemy.orm import relationship, deferred
+from .project import Base, JSONDocument
 
 
 class Calculation(Base):
     """Stores all calculated values from Excel formulas"""
     __tablename__ = "calculations"
+    __table_args__ = (
+        Index("ix_calculations_project_type", "project_id", "calculation_type"),
+        Index(
+            "ix_calculations_component_costs_gin", "component_costs", postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+    )
     
     id = Column(Integer, primary_key=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
@@ -22,7 +27,7 @@ class Calculation(Base):
     formula_version = Column(String(20), default="3.20")  # Track Excel version
     
     # Raw calculation inputs (preserve Excel cell references)
-    input_data = Column(JSON)  # All input values used
+    input_data = deferred(Column(JSONDocument), group="detail")  # All input values used
     
     # Calculation results
     base_labor_cost = Column(Float)
@@ -40,13 +45,13 @@ class Calculation(Base):
     total_amount = Column(Float)
     
     # Component breakdowns
-    component_costs = Column(JSON)  # Detailed breakdown by component
+    component_costs = deferred(Column(JSONDocument), group="detail")  # Detailed breakdown by component
     
-    # Audit trail
-    formula_trace = Column(JSON)  # Step-by-step calculation trace
-    excel_references = Column(JSON)  # Original Excel cell references
+    # Audit trail, only loaded when inspected
+    formula_trace = deferred(Column(JSON), group="audit")  # Step-by-step calculation trace
+    excel_references = deferred(Column(JSON), group="audit")  # Original Excel cell references
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
     
     # Relationships
     project = relationship("Project", back_populates="calculations")
@@ -56,6 +61,10 @@ class Calculation(Base):
 class PricingRule(Base):
     """Stores pricing rules from Data2 and hidden pricing tables"""
     __tablename__ = "pricing_rules"
+    __table_args__ = (
+        # Pricing lookups go by the Excel composite key
+        Index("ix_pricing_rules_rule_key", "rule_key"),
+    )
     
     id = Column(Integer, primary_key=True)
     calculation_id = Column(Integer, ForeignKey("calculations.id"))
@@ -101,19 +110,19 @@ class FormulaDefinition(Base):
     complexity_score = Column(Integer)  # From Excel analysis
     
     # Converted formula
-    python_code = Column(Text)  # Python equivalent
+    python_code = deferred(Column(Text), group="code")  # Python equivalent
     dependencies = Column(JSON)  # List of other formulas this depends on
     
     # Validation
-    test_cases = Column(JSON)  # Input/output test cases
+    test_cases = deferred(Column(JSON), group="validation")  # Input/output test cases
     last_validated = Column(DateTime)
     
     # Usage tracking
     usage_count = Column(Integer, default=0)
     average_execution_time_ms = Column(Float)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
 
 class LookupTable(Base):
@@ -129,7 +138,7 @@ class LookupTable(Base):
     
     # Table data
     headers = Column(JSON)  # Column headers
-    data_rows = Column(JSON)  # All table data
+    data_rows = deferred(Column(JSON), group="data")  # All table data
     
     # Lookup configuration
     key_column = Column(Integer)  # Which column is the lookup key
@@ -139,5 +148,5 @@ class LookupTable(Base):
     uses_composite_key = Column(Boolean, default=False)
     composite_key_format = Column(String(200))  # e.g., "{col1} {col2} {col3}"
     
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
\ No newline at end of file
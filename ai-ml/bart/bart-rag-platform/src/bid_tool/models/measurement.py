@@ -3,16 +3,22 @@ Measurement models for BART bid tool.
 Maps to Excel sheets: Ext Measure, Int Measure, Cabinet Measure, Gutter, WW, Holiday Measure
 """
 
-from datetime import datetime
 from typing import Optional, Dict, Any
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, JSON, Float, ForeignKey, Text
-from sqlalchemy.orm import relationship
-from .project import Base
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, JSON, Float, ForeignKey, Text, Index, func
+from sqlalchemy.orm import relationship, deferred
+from .project import Base, JSONDocument
 
 
 class Measurement(Base):
     """Base measurement entity for all types of measurements"""
     __tablename__ = "measurements"
+    __table_args__ = (
+        # Measurements of one type for a project (e.g. exterior bid totals)
+        Index("ix_measurements_project_type", "project_id", "measurement_type"),
+        Index(
+            "ix_measurements_data_gin", "measurement_data", postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+    )
     
     id = Column(Integer, primary_key=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
@@ -29,8 +35,9 @@ class Measurement(Base):
     longitude = Column(Float)
     
     # Measurement data - stored as JSON to handle different types flexibly
-    # This preserves all the Excel cell data
-    measurement_data = Column(JSON, nullable=False)
+    # This preserves all the Excel cell data; loaded on access or with
+    # undefer_group("data")
+    measurement_data = deferred(Column(JSONDocument, nullable=False), group="data")
     
     # Calculated fields (from hidden Excel sheets)
     calculated_sqft = Column(Float)
@@ -38,8 +45,8 @@ class Measurement(Base):
     calculated_material_cost = Column(Float)
     calculated_labor_cost = Column(Float)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     created_by = Column(String(100))  # User who took measurement
     
     # Relationship
@@ -3,14 +3,20 @@ Project models for BART bid tool.
 Maps to Excel sheets: Client info Page, New Client Info Page
 """
 
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional, Dict, Any, List
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, JSON, Float, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, JSON, Float, ForeignKey, Text, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
+# Document columns: JSONB on PostgreSQL (binary, GIN-indexable, no reparse
+# on key extraction), plain JSON on other backends
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
+
 
 class Project(Base):
     """Main project/bid entity"""
@@ -40,8 +46,8 @@ class Project(Base):
     
     # Status
     status = Column(String(50), default="draft")  # draft, estimated, approved, in_progress, completed
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     # Relationships
     measurements = relationship("Measurement", back_populates="project", cascade="all, delete-orphan")
@@ -65,27 +71,116 @@ class Project(Base):
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for API responses"""
+        values = self._column_values()
+        lead_paint_year = values["lead_paint_year"]
         return {
-            "id": self.id,
-            "project_number": self.project_number,
-            "client_name": self.client_name,
-            "client_phone": self.client_phone,
-            "client_email": self.client_email,
+            "id": values["id"],
+            "project_number": values["project_number"],
+            "client_name": values["client_name"],
+            "client_phone": values["client_phone"],
+            "client_email": values["client_email"],
             "address": {
-                "street": self.client_address,
-                "city": self.city,
-                "state": self.state,
-                "zip": self.zip_code
+                "street": values["client_address"],
+                "city": values["city"],
+                "state": values["state"],
+                "zip": values["zip_code"]
             },
-            "project_type": self.project_type,
-            "lead_paint_risk": self.lead_paint_year and self.lead_paint_year < 1978,
-            "status": self.status,
+            "project_type": values["project_type"],
+            "lead_paint_risk": lead_paint_year and lead_paint_year < 1978,
+            "status": values["status"],
             "totals": {
-                "estimated_total": self.estimated_total,
-                "labor": self.estimated_labor,
-                "materials": self.estimated_materials,
-                "margin": self.margin_amount
+                "estimated_total": values["estimated_total"],
+                "labor": values["estimated_labor"],
+                "materials": values["estimated_materials"],
+                "margin": values["margin_amount"]
             },
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None
-        }
\ No newline at end of file
+            "created_at": _isoformat(values["created_at"]),
+            "updated_at": _isoformat(values["updated_at"])
+        }
+        
+    def to_dto(self) -> "ProjectDTO":
+        """Convert to a slotted DTO that orjson serializes without a dict"""
+        values = self._column_values()
+        lead_paint_year = values["lead_paint_year"]
+        return ProjectDTO(
+            values["id"],
+            values["project_number"],
+            values["client_name"],
+            values["client_phone"],
+            values["client_email"],
+            ProjectAddressDTO(
+                values["client_address"],
+                values["city"],
+                values["state"],
+                values["zip_code"]
+            ),
+            values["project_type"],
+            lead_paint_year and lead_paint_year < 1978,
+            values["status"],
+            ProjectTotalsDTO(
+                values["estimated_total"],
+                values["estimated_labor"],
+                values["estimated_materials"],
+                values["margin_amount"]
+            ),
+            values["created_at"],
+            values["updated_at"]
+        )
+        
+    def _column_values(self) -> Dict[str, Any]:
+        """Serialized column values, read from instance state when loaded"""
+        # Loaded columns are read straight from the instance state, skipping
+        # the attribute descriptors; expired or deferred ones load normally
+        values = self.__dict__
+        if any(column not in values for column in _PROJECT_DICT_COLUMNS):
+            values = {column: getattr(self, column) for column in _PROJECT_DICT_COLUMNS}
+        return values
+
+
+@dataclass(slots=True)
+class ProjectAddressDTO:
+    """Client address block of a serialized project"""
+    street: Optional[str]
+    city: Optional[str]
+    state: Optional[str]
+    zip: Optional[str]
+
+
+@dataclass(slots=True)
+class ProjectTotalsDTO:
+    """Cached calculation totals of a serialized project"""
+    estimated_total: Optional[float]
+    labor: Optional[float]
+    materials: Optional[float]
+    margin: Optional[float]
+
+
+@dataclass(slots=True)
+class ProjectDTO:
+    """Project as returned by list endpoints; same shape as Project.to_dict"""
+    id: int
+    project_number: str
+    client_name: str
+    client_phone: Optional[str]
+    client_email: Optional[str]
+    address: ProjectAddressDTO
+    project_type: Optional[str]
+    lead_paint_risk: Optional[bool]
+    status: Optional[str]
+    totals: ProjectTotalsDTO
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+
+# Columns serialized by Project.to_dict and Project.to_dto
+_PROJECT_DICT_COLUMNS = (
+    "id", "project_number", "client_name", "client_phone", "client_email",
+    "client_address", "city", "state", "zip_code", "project_type",
+    "lead_paint_year", "status", "estimated_total", "estimated_labor",
+    "estimated_materials", "margin_amount", "created_at", "updated_at",
+)
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    """ISO 8601 string for a timestamp column, None when unset"""
+    return value.isoformat() if value else None
\ No newline at end of file
@@ -3,17 +3,202 @@ Excel importer for BART 3.20 workbook.
 Extracts all data, formulas, and business logic while preserving structure.
 """
 
-import pandas as pd
+import numpy as np
 import openpyxl
 from openpyxl.utils import get_column_letter
+from openpyxl.utils.cell import range_boundaries
+from xml.etree import ElementTree
+import functools
 import json
 import logging
+import zipfile
 from typing import Dict, Any, List, Tuple, Optional
 from pathlib import Path
 import re
+import sys
 
 logger = logging.getLogger(__name__)
 
+# Formula scanning patterns, compiled once for every formula in the workbook
+_VLOOKUP_RE = re.compile(r'VLOOKUP\s*\([^,]+,\s*([^,]+),\s*(\d+)', re.IGNORECASE)
+_CELL_REF_RE = re.compile(r'([A-Z]+[0-9]+)')
+_SHEET_REF_RE = re.compile(r"(?:'([^']+)'|([A-Za-z0-9_.]+))!([A-Z]+[0-9]+)")
+_FUNC_CALL_RE = re.compile(r'[A-Z]+\(')
+
+# Byte values for the vectorized complexity scan, used on formulas longer
+# than the threshold where numpy's per-call overhead is amortized
+_VECTORIZED_SCAN_MIN_LENGTH = 64
+_OPEN_PAREN = ord('(')
+_CLOSE_PAREN = ord(')')
+_UPPER_A = ord('A')
+_UPPER_Z = ord('Z')
+
+# Sheet name keywords, checked in order; the first hit decides the type
+_MEASUREMENT_SHEET_TYPES = (
+    ('ext', 'exterior_measurement'),
+    ('int', 'interior_measurement'),
+    ('cabinet', 'cabinet_measurement'),
+    ('holiday', 'holiday_measurement'),
+)
+_SHEET_TYPES = (
+    ('formula', 'calculation'),
+    ('pricing', 'calculation'),
+    ('crew', 'crew_assignment'),
+    ('checklist', 'checklist'),
+    ('client', 'client_info'),
+    ('how to', 'instructions'),
+)
+
+
+def _is_formula(value) -> bool:
+    """openpyxl stores formulas as the cell value, a string starting with '='"""
+    return type(value) is str and value[:1] == '='
+
+
+@functools.lru_cache(maxsize=256)
+def _identify_sheet_type(sheet_name: str) -> str:
+    """Identify the type of sheet based on name"""
+    
+    name_lower = sheet_name.lower()
+    
+    if 'measure' in name_lower:
+        for keyword, sheet_type in _MEASUREMENT_SHEET_TYPES:
+            if keyword in name_lower:
+                return sheet_type
+        return 'measurement'
+        
+    for keyword, sheet_type in _SHEET_TYPES:
+        if keyword in name_lower:
+            return sheet_type
+            
+    return 'other'
+
+
+# Formulas filled down with absolute references repeat verbatim across
+# cells, so analysis is shared per (formula, sheet); callers must not
+# mutate the returned lists
+@functools.lru_cache(maxsize=8192)
+def _analyze_formula(formula: str, sheet_name: str) -> Dict[str, Any]:
+    """Scan a formula once for dependencies, VLOOKUP tables and complexity"""
+    
+    deps = set()
+    
+    # Sheet-qualified references first, then blank them out so the bare
+    # cell pattern does not also count them against the current sheet
+    bare_formula = formula
+    if '!' in formula:
+        for quoted_sheet, sheet, cell in _SHEET_REF_RE.findall(formula):
+            deps.add(f"{quoted_sheet or sheet}!{cell}")
+        bare_formula = _SHEET_REF_RE.sub(' ', formula)
+        
+    for ref in _CELL_REF_RE.findall(bare_formula):
+        deps.add(f"{sheet_name}!{ref}")
+        
+    # Excel serializes function names in uppercase, so most formulas
+    # are rejected here without running the VLOOKUP pattern
+    vlookup_refs = []
+    if 'VLOOKUP' in formula:
+        for table_ref, col_index in _VLOOKUP_RE.findall(formula):
+            vlookup_refs.append((table_ref.strip(), int(col_index)))
+            
+    return {
+        'dependencies': list(deps),
+        'vlookup_refs': vlookup_refs,
+        'complexity': _calculate_formula_complexity(formula)
+    }
+
+
+def _calculate_formula_complexity(formula: str) -> int:
+    """Calculate complexity score for formula"""
+    
+    if len(formula) > _VECTORIZED_SCAN_MIN_LENGTH:
+        func_calls, max_depth = _scan_formula_vectorized(formula)
+    else:
+        # Count function calls
+        func_calls = len(_FUNC_CALL_RE.findall(formula))
+        
+        # Count nested parentheses
+        max_depth = 0
+        current_depth = 0
+        for char in formula:
+            if char == '(':
+                current_depth += 1
+                if current_depth > max_depth:
+                    max_depth = current_depth
+            elif char == ')':
+                current_depth -= 1
+                
+    # Count conditions
+    return func_calls * 2 + max_depth * 3 + formula.count('IF') * 5
+
+
+def _scan_formula_vectorized(formula: str) -> Tuple[int, int]:
+    """Function call count and max paren depth of a long formula via numpy"""
+    
+    # One byte per character so neighbours stay adjacent
+    buf = np.frombuffer(formula.encode('ascii', 'replace'), dtype=np.uint8)
+    opens = buf == _OPEN_PAREN
+    
+    # A function call is a '(' directly after an uppercase letter
+    uppercase = (buf >= _UPPER_A) & (buf <= _UPPER_Z)
+    func_calls = int(np.count_nonzero(opens[1:] & uppercase[:-1]))
+    
+    # Nesting depth is the running maximum of +1 per '(' and -1 per ')'
+    deltas = opens.astype(np.int8) - (buf == _CLOSE_PAREN).astype(np.int8)
+    max_depth = int(np.cumsum(deltas).max(initial=0))
+    
+    return func_calls, max_depth
+
+
+# SpreadsheetML namespaces used when reading sheet layout straight from XML
+_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_DOC_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+def _sheet_xml_paths(archive: zipfile.ZipFile) -> Dict[str, str]:
+    """Map each sheet name to its worksheet XML part in the archive"""
+    with archive.open('xl/_rels/workbook.xml.rels') as source:
+        targets = {
+            rel.get('Id'): rel.get('Target')
+            for rel in ElementTree.parse(source).getroot().iter(f'{_PKG_REL_NS}Relationship')
+        }
+    with archive.open('xl/workbook.xml') as source:
+        sheets = ElementTree.parse(source).getroot().iter(f'{_MAIN_NS}sheet')
+        paths = {}
+        for sheet in sheets:
+            target = targets[sheet.get(f'{_DOC_REL_NS}id')]
+            paths[sheet.get('name')] = target[1:] if target.startswith('/') else f'xl/{target}'
+    return paths
+
+
+def _read_sheet_layout(archive: zipfile.ZipFile, path: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Merged ranges and data validations of one sheet, parsed incrementally
+    from its XML; rows are discarded as they are passed.
+    """
+    merged_ranges = []
+    validations = []
+    
+    with archive.open(path) as source:
+        for _, element in ElementTree.iterparse(source):
+            tag = element.tag
+            if tag == f'{_MAIN_NS}row':
+                element.clear()
+            elif tag == f'{_MAIN_NS}mergeCell':
+                merged_ranges.append(element.get('ref'))
+            elif tag == f'{_MAIN_NS}dataValidation':
+                validations.append({
+                    'range': element.get('sqref'),
+                    'type': element.get('type'),
+                    'formula': element.findtext(f'{_MAIN_NS}formula1'),
+                    'allow_blank': element.get('allowBlank') in ('1', 'true'),
+                    'show_dropdown': element.get('showDropDown') in ('1', 'true')
+                })
+                element.clear()
+                
+    return merged_ranges, validations
+
 
 class BARTExcelImporter:
     """Import and convert BART 3.20 Excel workbook"""
@@ -25,34 +210,14 @@ class BARTExcelImporter:
         self.formulas = {}
         self.lookups = {}
         self.validations = {}
+        self.table_sheets = []
         
     def import_all(self) -> Dict[str, Any]:
         """Import entire Excel workbook preserving all information"""
         logger.info(f"Starting import of {self.excel_path}")
         
-        # Load workbook
-        self.workbook = openpyxl.load_workbook(
-            self.excel_path, 
-            data_only=False,  # Keep formulas
-            keep_vba=True
-        )
-        
-        # Process each sheet
-        for sheet_name in self.workbook.sheetnames:
-            logger.info(f"Processing sheet: {sheet_name}")
-            sheet = self.workbook[sheet_name]
-            
-            # Skip if sheet is hidden (but still extract formulas)
-            if sheet.sheet_state == 'hidden':
-                self._extract_hidden_sheet_logic(sheet_name, sheet)
-            else:
-                self._extract_visible_sheet_data(sheet_name, sheet)
-                
-        # Extract all VLOOKUP references
-        self._extract_lookup_tables()
-        
-        # Extract data validations (dropdowns)
-        self._extract_validations()
+        self.import_formulas()
+        self.import_data()
         
         # Build formula dependency graph
         formula_graph = self._build_formula_dependencies()
@@ -71,11 +236,97 @@ class BARTExcelImporter:
             }
         }
         
-    def _extract_visible_sheet_data(self, sheet_name: str, sheet):
+    def import_formulas(self):
+        """Extract formulas, form layout and validations with openpyxl"""
+        
+        # Load workbook in streaming mode - cells are parsed row by row
+        # instead of materializing the whole cell graph in memory
+        self.workbook = openpyxl.load_workbook(
+            self.excel_path,
+            read_only=True,
+            data_only=False,  # Keep formulas
+            keep_links=False
+        )
+        
+        try:
+            # Read-only worksheets do not expose merged ranges or data
+            # validations, so they are parsed from each sheet's XML, which
+            # streams like the cells and never builds the cell graph
+            with zipfile.ZipFile(self.excel_path) as archive:
+                sheet_paths = _sheet_xml_paths(archive)
+                
+                for sheet_name in self.workbook.sheetnames:
+                    logger.info(f"Processing sheet: {sheet_name}")
+                    merged_ranges, validations = _read_sheet_layout(archive, sheet_paths[sheet_name])
+                    
+                    # Data validations (dropdowns)
+                    for validation in validations:
+                        self.validations[f"{sheet_name}_{validation['range']}"] = {
+                            'sheet': sheet_name,
+                            **validation
+                        }
+                        
+                    # Skip if sheet is hidden (but still extract formulas)
+                    sheet = self.workbook[sheet_name]
+                    if sheet.sheet_state == 'hidden':
+                        self._extract_hidden_sheet_logic(sheet_name, sheet)
+                    else:
+                        self._extract_visible_sheet_data(sheet_name, sheet, merged_ranges)
+        finally:
+            # Read-only workbooks keep the source archive open
+            self.workbook.close()
+            
+        # Extract all VLOOKUP references
+        self._extract_lookup_tables()
+        
+    def import_data(self):
+        """Extract value-only pricing tables from hidden sheets"""
+        
+        if not self.table_sheets:
+            return
+            
+        # Cached results instead of formulas, streamed; one parse of the
+        # workbook shared by all table sheets
+        values_workbook = openpyxl.load_workbook(
+            self.excel_path,
+            read_only=True,
+            data_only=True,
+            keep_links=False
+        )
+        
+        try:
+            for sheet_name in self.table_sheets:
+                # Find table boundaries
+                table_data = []
+                headers = []
+                
+                for row in values_workbook[sheet_name].iter_rows(values_only=True):
+                    values = [v for v in row if v is not None]
+                    if not values:
+                        continue
+                        
+                    if not headers:
+                        headers = [str(h) for h in values]
+                    else:
+                        table_data.append(values)
+                        
+                if headers and table_data:
+                    lookup_key = self._generate_lookup_key(sheet_name)
+                    self.lookups[lookup_key] = {
+                        'sheet': sheet_name,
+                        'headers': headers,
+                        'data': table_data,
+                        'composite_key': self._detect_composite_key(headers)
+                    }
+        finally:
+            values_workbook.close()
+        
+    def _extract_visible_sheet_data(self, sheet_name: str, sheet,
+                                    merged_ranges: List[str] = ()):
         """Extract data from visible sheets (measurement forms)"""
         
         # Identify sheet type
-        sheet_type = self._identify_sheet_type(sheet_name)
+        sheet_type = _identify_sheet_type(sheet_name)
         
         # Extract form structure
         form_data = {
@@ -87,44 +338,58 @@ class BARTExcelImporter:
             'dropdowns': []
         }
         
-        # Process merged cells (form labels)
-        for merged_range in sheet.merged_cells.ranges:
-            form_data['merged_cells'].append({
-                'range': str(merged_range),
-                'value': sheet[merged_range.min_row][merged_range.min_col - 1].value
-            })
+        # Merged cells (form labels); each label value is filled in when
+        # its top-left cell is streamed
+        merged_anchors = {}
+        for range_ref in merged_ranges:
+            merged_cell = {'range': range_ref, 'value': None}
+            form_data['merged_cells'].append(merged_cell)
+            min_col, min_row, _, _ = range_boundaries(range_ref)
+            merged_anchors.setdefault(min_row, {})[min_col] = merged_cell
+            
+        # Nearest label above each column, tracked while streaming rows
+        labels_above = {}
+        
+        # Extract all cells with data or formulas; only the sparse input
+        # fields and formulas read anything beyond the value
+        for row_idx, row in enumerate(sheet.iter_rows(), start=1):
+            # Nearest label to the left, carried along the row
+            left_label = None
+            row_anchors = merged_anchors.get(row_idx, {})
             
-        # Extract all cells with data or formulas
-        for row in sheet.iter_rows():
             for cell in row:
-                if cell.value is not None or cell.formula is not None:
-                    cell_data = {
-                        'address': cell.coordinate,
-                        'value': cell.value,
-                        'formula': cell.formula,
-                        'data_type': cell.data_type,
-                        'number_format': cell.number_format
-                    }
-                    
-                    # Check if this is a form field
+                value = cell.value
+                
+                # Check if this is a form field
+                if value is None:
                     if self._is_input_field(cell):
                         form_data['fields'].append({
-                            'name': self._get_field_name(sheet, cell),
+                            'name': self._get_field_name(cell, left_label, labels_above),
                             'address': cell.coordinate,
                             'type': self._get_field_type(cell),
                             'required': self._is_required_field(sheet, cell)
                         })
-                        
-                    # Store formula
-                    if cell.formula:
-                        formula_key = f"{sheet_name}!{cell.coordinate}"
-                        self.formulas[formula_key] = {
-                            'formula': cell.formula,
-                            'sheet': sheet_name,
-                            'cell': cell.coordinate,
-                            'dependencies': self._extract_formula_deps(cell.formula)
-                        }
-                        
+                    continue
+                    
+                if cell.column in row_anchors:
+                    row_anchors[cell.column]['value'] = value
+                    
+                # Read-only mode returns formulas as the cell value
+                if _is_formula(value):
+                    formula = sys.intern(value)
+                    formula_key = f"{sheet_name}!{cell.coordinate}"
+                    self.formulas[formula_key] = {
+                        'formula': formula,
+                        'sheet': sheet_name,
+                        'cell': cell.coordinate,
+                        **_analyze_formula(formula, sheet_name)
+                    }
+                    
+                # Fields only look at labels from earlier rows; a field's own
+                # column is never updated in its row since the field is blank
+                if value:
+                    left_label = labels_above[cell.column] = str(value)
+                    
         self.data[sheet_name] = form_data
         
     def _extract_hidden_sheet_logic(self, sheet_name: str, sheet):
@@ -140,40 +405,22 @@ class BARTExcelImporter:
         
         # Identify if this is a pricing table
         if 'pricing' in sheet_name.lower() or 'formula' in sheet_name.lower():
-            # Extract as lookup table
-            df = pd.read_excel(self.excel_path, sheet_name=sheet_name)
-            
-            # Find table boundaries
-            table_data = []
-            headers = []
-            
-            for idx, row in df.iterrows():
-                if not row.isna().all():
-                    if not headers:
-                        headers = [str(h) for h in row if pd.notna(h)]
-                    else:
-                        table_data.append([v for v in row if pd.notna(v)])
-                        
-            if headers and table_data:
-                lookup_key = self._generate_lookup_key(sheet_name)
-                self.lookups[lookup_key] = {
-                    'sheet': sheet_name,
-                    'headers': headers,
-                    'data': table_data,
-                    'composite_key': self._detect_composite_key(headers)
-                }
+            # Extracted as lookup table by import_data
+            self.table_sheets.append(sheet_name)
                 
-        # Extract all formulas
-        for row in sheet.iter_rows():
-            for cell in row:
-                if cell.formula:
-                    formula_key = f"{sheet_name}!{cell.coordinate}"
+        # Extract all formulas; plain values skip cell object construction
+        for row_idx, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+            for col_idx, value in enumerate(row, start=1):
+                if _is_formula(value):
+                    formula = sys.intern(value)
+                    coordinate = f"{get_column_letter(col_idx)}{row_idx}"
+                    formula_key = f"{sheet_name}!{coordinate}"
                     self.formulas[formula_key] = {
-                        'formula': cell.formula,
+                        'formula': formula,
                         'sheet': sheet_name,
-                        'cell': cell.coordinate,
+                        'cell': coordinate,
                         'is_hidden': True,
-                        'complexity': self._calculate_formula_complexity(cell.formula)
+                        **_analyze_formula(formula, sheet_name)
                     }
                     
         self.data[sheet_name] = hidden_data
@@ -181,137 +428,67 @@ class BARTExcelImporter:
     def _extract_lookup_tables(self):
         """Extract all VLOOKUP table references"""
         
-        # Parse all formulas to find VLOOKUP references
-        vlookup_pattern = r'VLOOKUP\s*\([^,]+,\s*([^,]+),\s*(\d+)'
+        # Columns used per table as a bitset of small column indices
+        columns_used_bits = {}
         
+        # VLOOKUP calls were parsed when each formula was first read
         for formula_key, formula_data in self.formulas.items():
-            formula = formula_data['formula']
-            
-            # Find VLOOKUP calls
-            matches = re.findall(vlookup_pattern, formula, re.IGNORECASE)
-            for table_ref, col_index in matches:
-                # Clean table reference
-                table_ref = table_ref.strip()
-                
+            for table_ref, col_index in formula_data['vlookup_refs']:
                 # Track usage
                 if table_ref not in self.lookups:
                     self.lookups[table_ref] = {
                         'references': [],
-                        'columns_used': set()
+                        'columns_used': []
                     }
                     
                 self.lookups[table_ref]['references'].append(formula_key)
-                self.lookups[table_ref]['columns_used'].add(int(col_index))
+                columns_used_bits[table_ref] = columns_used_bits.get(table_ref, 0) | (1 << col_index)
                 
-    def _extract_validations(self):
-        """Extract data validations (dropdowns)"""
-        
-        for sheet_name in self.workbook.sheetnames:
-            sheet = self.workbook[sheet_name]
+        # Sorted column lists, so lookups stay JSON-serializable
+        for table_ref, bits in columns_used_bits.items():
+            self.lookups[table_ref]['columns_used'] = [
+                col_index for col_index in range(bits.bit_length()) if bits >> col_index & 1
+            ]
             
-            # Check for data validations
-            if hasattr(sheet, 'data_validations'):
-                for validation in sheet.data_validations.dataValidation:
-                    self.validations[f"{sheet_name}_{validation.sqref}"] = {
-                        'sheet': sheet_name,
-                        'range': str(validation.sqref),
-                        'type': validation.type,
-                        'formula': validation.formula1,
-                        'allow_blank': validation.allowBlank,
-                        'show_dropdown': validation.showDropDown
-                    }
-                    
     def _build_formula_dependencies(self) -> Dict[str, List[str]]:
         """Build dependency graph for formulas"""
         
-        dependencies = {}
+        return {
+            formula_key: formula_data['dependencies']
+            for formula_key, formula_data in self.formulas.items()
+        }
         
-        for formula_key, formula_data in self.formulas.items():
-            deps = []
-            formula = formula_data['formula']
-            
-            # Extract cell references
-            cell_refs = re.findall(r'([A-Z]+[0-9]+)', formula)
-            sheet_refs = re.findall(r"'?([^'!]+)'?!([A-Z]+[0-9]+)", formula)
-            
-            # Add dependencies
-            for ref in cell_refs:
-                deps.append(f"{formula_data['sheet']}!{ref}")
-                
-            for sheet, cell in sheet_refs:
-                deps.append(f"{sheet}!{cell}")
-                
-            dependencies[formula_key] = list(set(deps))
-            
-        return dependencies
-        
-    def _identify_sheet_type(self, sheet_name: str) -> str:
-        """Identify the type of sheet based on name"""
-        
-        name_lower = sheet_name.lower()
-        
-        if 'measure' in name_lower:
-            if 'ext' in name_lower:
-                return 'exterior_measurement'
-            elif 'int' in name_lower:
-                return 'interior_measurement'
-            elif 'cabinet' in name_lower:
-                return 'cabinet_measurement'
-            elif 'holiday' in name_lower:
-                return 'holiday_measurement'
-            else:
-                return 'measurement'
-        elif 'formula' in name_lower or 'pricing' in name_lower:
-            return 'calculation'
-        elif 'crew' in name_lower:
-            return 'crew_assignment'
-        elif 'checklist' in name_lower:
-            return 'checklist'
-        elif 'client' in name_lower:
-            return 'client_info'
-        elif 'how to' in name_lower:
-            return 'instructions'
-        else:
-            return 'other'
-            
     def _is_input_field(self, cell) -> bool:
         """Determine if a cell is an input field"""
         
-        # Input fields typically have no formula and specific formatting
-        return (
-            cell.formula is None and
-            cell.value is None and
-            cell.fill.start_color.index in ['FFFFFF', 'FFFF00', None]  # White/yellow
-        )
+        # Input fields are blank cells the form explicitly formats; read-only
+        # sheets return unformatted blanks as EmptyCell, which has no style
+        return cell.value is None and getattr(cell, 'has_style', False)
         
-    def _get_field_name(self, sheet, cell) -> str:
+    def _get_field_name(self, cell, left_label: Optional[str], labels_above: Dict[int, str]) -> str:
         """Extract field name from nearby label"""
         
         # Look for label in cells to the left
-        row = cell.row
-        for col in range(cell.column - 1, 0, -1):
-            label_cell = sheet.cell(row=row, column=col)
-            if label_cell.value:
-                return str(label_cell.value)
-                
+        if left_label is not None:
+            return left_label
+            
         # Look above
-        col = cell.column
-        for row in range(cell.row - 1, 0, -1):
-            label_cell = sheet.cell(row=row, column=col)
-            if label_cell.value:
-                return str(label_cell.value)
+        if cell.column in labels_above:
+            return labels_above[cell.column]
                 
         return f"Field_{cell.coordinate}"
         
     def _get_field_type(self, cell) -> str:
         """Determine field type from formatting"""
         
-        if cell.number_format:
-            if '$' in cell.number_format:
+        # Each number_format access resolves the style table, read it once
+        number_format = cell.number_format
+        if number_format:
+            if '$' in number_format:
                 return 'currency'
-            elif '%' in cell.number_format:
+            elif '%' in number_format:
                 return 'percentage'
-            elif '0' in cell.number_format:
+            elif '0' in number_format:
                 return 'number'
                 
         return 'text'
@@ -325,31 +502,6 @@ class BARTExcelImporter:
             
         return False
         
-    def _calculate_formula_complexity(self, formula: str) -> int:
-        """Calculate complexity score for formula"""
-        
-        score = 0
-        
-        # Count function calls
-        functions = re.findall(r'[A-Z]+\(', formula)
-        score += len(functions) * 2
-        
-        # Count nested parentheses
-        max_depth = 0
-        current_depth = 0
-        for char in formula:
-            if char == '(':
-                current_depth += 1
-                max_depth = max(max_depth, current_depth)
-            elif char == ')':
-                current_depth -= 1
-        score += max_depth * 3
-        
-        # Count conditions
-        score += formula.count('IF') * 5
-        
-        return score
-        
     def _detect_composite_key(self, headers: List[str]) -> Optional[str]:
         """Detect if table uses composite keys"""
         
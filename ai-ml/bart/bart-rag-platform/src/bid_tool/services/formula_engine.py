@@ -4,17 +4,349 @@ Converts Excel formulas to Python while maintaining exact calculation logic.
 """
 
 import re
+import ast
+import bisect
 import json
-from typing import Dict, Any, List, Optional, Tuple, Union
-from decimal import Decimal, getcontext
+import functools
+import math
+import numbers
+from collections import OrderedDict
+from collections.abc import Mapping
+from types import CodeType
+from typing import TYPE_CHECKING, Dict, Any, Callable, List, Optional, Set, Tuple, Union
 import logging
-from datetime import datetime
+import time
+import numpy as np
 
-# Set decimal precision to match Excel
-getcontext().prec = 15
+if TYPE_CHECKING:
+    import pandas as pd
+
+try:
+    from numba import njit
+except ImportError:  # Kernels run as plain Python functions
+    njit = None
+
+try:
+    import numexpr
+except ImportError:  # Batch expressions run as plain NumPy
+    numexpr = None
 
 logger = logging.getLogger(__name__)
 
+# Read once so hot paths skip debug calls and their formatting; call
+# reconfigure() after changing logging levels at runtime
+_DEBUG = logger.isEnabledFor(logging.DEBUG)
+
+
+def reconfigure():
+    """Re-read whether debug logging is enabled for this module"""
+    global _DEBUG
+    _DEBUG = logger.isEnabledFor(logging.DEBUG)
+
+# Cell references rewritten to self.get_cell() lookups
+_CELL_REF_PATTERN = re.compile(r'([A-Z]+[0-9]+)')
+
+# Positional placeholders standing in for cell references in formula templates
+_REF_PLACEHOLDER_PATTERN = re.compile(r'\x00(\d+)\x00')
+
+# Excel functions and operators translated to Python, matched in one pass
+_FUNCTION_PATTERN = re.compile(
+    r'(?P<iferror>\bIFERROR\s*\()|(?P<if>\bIF\s*\()|(?P<vlookup>\bVLOOKUP\s*\()'
+    r'|(?P<sum>\bSUM\s*\()|(?P<round>\bROUND\s*\()|(?P<concat>&)',
+    re.IGNORECASE
+)
+_FUNCTION_REPLACEMENTS = {
+    'iferror': 'self._iferror(lambda: ',  # Deferred so its errors can be caught
+    'if': 'self._if(',
+    'vlookup': 'self._vlookup(',
+    'sum': 'self._sum(',
+    'round': 'round(',
+    'concat': '+',  # String concatenation
+}
+
+# Marks VLOOKUP results that have not been looked up yet
+_MISSING = object()
+
+# The only builtins converted formulas can reach; check_formula_code keeps
+# formulas from walking to others through the objects in their globals
+_SAFE_BUILTINS = {'round': round, 'min': min, 'max': max, 'abs': abs, 'str': str}
+
+# Most recent VLOOKUP results each engine keeps
+_VL_CACHE_SIZE = 1024
+
+# Engine methods converted formula code may call on self
+_FORMULA_HELPERS = frozenset({'get_cell', '_if', '_iferror', '_vlookup', '_sum'})
+
+# Cells read by converted formula code
+_GET_CELL_PATTERN = re.compile(r'self\.get_cell\("([A-Z]+[0-9]+)"\)')
+
+
+class _CellValues(Mapping):
+    """Read-only view of an engine's cell array by cell reference"""
+    
+    def __init__(self, index: Dict[str, int], values: List[Any]):
+        self._index = index
+        self._values = values
+        
+    def __getitem__(self, cell_ref: str) -> Any:
+        return self._values[self._index[cell_ref]]
+        
+    def __iter__(self):
+        return iter(self._index)
+        
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class CircularReferenceError(ValueError):
+    """Raised when executing a formula that depends on a reference cycle"""
+
+
+class UnsafeFormulaError(ValueError):
+    """Raised for formula code reaching beyond the engine's formula helpers"""
+
+
+def check_formula_code(python_code: str) -> ast.Expression:
+    """
+    Parse converted formula code, rejecting dunder names and any attribute
+    access other than engine helpers on self and .get on inlined lookup
+    columns. Returns the parsed expression.
+    """
+    tree = ast.parse(python_code, mode='eval')
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id.startswith('__'):
+            raise UnsafeFormulaError(f"Formula code uses {node.id}")
+        if isinstance(node, ast.Attribute):
+            owner = node.value
+            if not (isinstance(owner, ast.Name) and (
+                    (owner.id == 'self' and node.attr in _FORMULA_HELPERS)
+                    or (owner.id.startswith('_vlookup_') and node.attr == 'get'))):
+                raise UnsafeFormulaError(f"Formula code uses attribute {node.attr}")
+    return tree
+
+
+@functools.lru_cache(maxsize=4096)
+def _translate_formula_template(template: str) -> str:
+    """
+    Translate an Excel formula whose cell references have been replaced
+    by placeholders. Cached on the template text, so each distinct
+    formula shape is parsed only once.
+    """
+    # Remove leading = sign, then convert Excel functions to Python
+    return _FUNCTION_PATTERN.sub(
+        lambda match: _FUNCTION_REPLACEMENTS[match.lastgroup], template.strip('=')
+    )
+
+
+class _LazyIf(ast.NodeTransformer):
+    """
+    Compiles self._if(condition, a, b) to a conditional expression, so only
+    the chosen branch is evaluated, as in Excel and in formula kernels.
+    """
+    
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        self.generic_visit(node)
+        func = node.func
+        if (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name)
+                and func.value.id == 'self' and func.attr == '_if'
+                and len(node.args) == 3 and not node.keywords):
+            return ast.copy_location(ast.IfExp(*node.args), node)
+        return node
+
+
+@functools.lru_cache(maxsize=4096)
+def _compile_formula_source(python_code: str) -> CodeType:
+    """Compile converted formula source; identical sources share one code object"""
+    tree = _LazyIf().visit(check_formula_code(python_code))
+    return compile(ast.fix_missing_locations(tree), '<formula>', 'eval')
+
+
+def _excel_sum(*args) -> float:
+    """Excel SUM over values and ranges, skipping blanks; summed exactly with fsum"""
+    return math.fsum(
+        float(value)
+        for arg in args
+        for value in (arg if isinstance(arg, (list, tuple)) else (arg,))
+        if value is not None
+    )
+
+
+class FormulaCodegen(ast.NodeTransformer):
+    """
+    Generates a specialized function for a purely numeric converted formula.
+    Cell lookups become reads from a flat array and IF becomes a conditional
+    expression; the function is JIT compiled when Numba is installed. SUM
+    calls the engine's fsum-based helper, so it is only kept without Numba.
+    """
+    
+    # Only operators Numba types for float64 operands; anything else
+    # (bitwise, floor division, ...) stays on the eval path
+    _NODES = (
+        ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.IfExp,
+        ast.Subscript, ast.Name, ast.Load,
+        ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.UAdd, ast.USub,
+        ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE
+    )
+    
+    def __init__(self):
+        self.refs: Dict[str, int] = {}
+        self.numeric = True
+        
+    @classmethod
+    def generate(cls, python_code: str) -> Optional[Tuple[Callable, Tuple[str, ...]]]:
+        """
+        Return (kernel, cell_refs), where kernel takes the values of
+        cell_refs in order, or None if the formula is not purely numeric.
+        """
+        codegen = cls()
+        try:
+            tree = codegen.visit(ast.parse(python_code, mode='eval'))
+        except SyntaxError:
+            return None
+            
+        if not codegen.numeric or not all(codegen._allowed(node) for node in ast.walk(tree)):
+            return None
+            
+        # JIT kernels run on float cells only; their result must have the
+        # type eval gives for the same floats, not a unified Numba type
+        if njit is not None and codegen._result_type(tree.body) is None:
+            return None
+            
+        namespace = {'__builtins__': _SAFE_BUILTINS, '_sum': _excel_sum}
+        exec(f"def _f(cells):\n    return {ast.unparse(tree.body)}", namespace)
+        kernel = namespace['_f']
+        if njit is not None:
+            # No cache=True: Numba can only cache functions defined in files
+            kernel = njit(nogil=True)(kernel)
+        return kernel, tuple(codegen.refs)
+        
+    def _allowed(self, node: ast.AST) -> bool:
+        """Whether a transformed node can appear in a kernel"""
+        if isinstance(node, ast.Constant):
+            return type(node.value) in (int, float, bool)
+        if isinstance(node, ast.Name):
+            return node.id in ('cells', 'round', '_sum')
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.keywords:
+                return False
+            if node.func.id == 'round':
+                # Numba needs the number of digits as a literal integer
+                return len(node.args) == 1 or (
+                    len(node.args) == 2 and isinstance(node.args[1], ast.Constant)
+                    and type(node.args[1].value) is int
+                )
+            return node.func.id == '_sum'
+        return isinstance(node, self._NODES)
+        
+    def _result_type(self, node: ast.AST) -> Optional[type]:
+        """
+        Python type of a transformed expression over float cells, or None
+        if it depends on the values (an IF choosing between types, integer
+        powers, one-argument round).
+        """
+        if isinstance(node, ast.Constant):
+            return type(node.value)
+        if isinstance(node, ast.Subscript):
+            return float
+        if isinstance(node, ast.Compare):
+            return bool
+        if isinstance(node, ast.UnaryOp):
+            operand = self._result_type(node.operand)
+            return int if operand is bool else operand
+        if isinstance(node, ast.IfExp):
+            body = self._result_type(node.body)
+            return body if body == self._result_type(node.orelse) else None
+        if isinstance(node, ast.Call):
+            # _sum never reaches JIT kernels
+            if node.func.id == 'round' and len(node.args) == 2 and self._result_type(node.args[0]) is float:
+                return float
+            return None
+        if isinstance(node, ast.BinOp):
+            left, right = self._result_type(node.left), self._result_type(node.right)
+            if left is None or right is None:
+                return None
+            if float in (left, right) or isinstance(node.op, ast.Div):
+                return float
+            return None if isinstance(node.op, ast.Pow) else int
+        return None
+        
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        """Rewrite engine helper calls into kernel expressions"""
+        func = node.func
+        if not (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name)
+                and func.value.id == 'self'):
+            return self.generic_visit(node)
+            
+        args = node.args
+        if func.attr == 'get_cell' and len(args) == 1 and isinstance(args[0], ast.Constant):
+            index = self.refs.setdefault(args[0].value, len(self.refs))
+            return ast.Subscript(ast.Name('cells', ast.Load()), ast.Constant(index), ast.Load())
+            
+        args = [self.visit(arg) for arg in args]
+        if func.attr == '_if' and len(args) == 3 and not node.keywords:
+            return ast.IfExp(args[0], args[1], args[2])
+        if func.attr == '_sum' and not node.keywords and njit is None:
+            return ast.Call(ast.Name('_sum', ast.Load()), args, [])
+            
+        self.numeric = False
+        return node
+
+
+def quantize_cents(amount: float) -> float:
+    """Round a currency amount to cents; all math stays in float64, as in Excel"""
+    return round(amount, 2)
+
+
+@functools.lru_cache(maxsize=64)
+def _excel_order_key(value: Any) -> Tuple[int, Any]:
+    """
+    Sort key ordering lookup keys as Excel does: numbers by value, then
+    text, then logicals. The first item is the key's type group.
+    """
+    if isinstance(value, bool):
+        return 2, value
+    if isinstance(value, numbers.Real):
+        return 0, value
+    return 1, str(value)
+
+
+@functools.lru_cache(maxsize=64)
+def _margin_k(margin1: float, margin2: float) -> float:
+    """Combined 2-tier margin multiplier; bids mostly reuse a few margin pairs"""
+    if margin1 >= 1 or margin2 >= 1:
+        raise ValueError("Margin cannot be 100% or greater")
+    return 1.0 / ((1 - margin1) * (1 - margin2))
+
+
+def _split_call_args(code: str, start: int) -> Tuple[Optional[List[str]], int]:
+    """
+    Split the top-level arguments of a call whose opening parenthesis
+    ends at start. Returns (None, start) if the call is unterminated.
+    """
+    args = []
+    depth = 0
+    in_string = False
+    arg_start = start
+    
+    for pos in range(start, len(code)):
+        char = code[pos]
+        if char == '"':
+            in_string = not in_string
+        elif in_string:
+            continue
+        elif char in '([{':
+            depth += 1
+        elif char in ')]}':
+            if depth == 0:
+                args.append(code[arg_start:pos])
+                return args, pos + 1
+            depth -= 1
+        elif char == ',' and depth == 0:
+            args.append(code[arg_start:pos])
+            arg_start = pos + 1
+            
+    return None, start
+
 
 class ExcelFormulaEngine:
     """
@@ -22,16 +354,83 @@ class ExcelFormulaEngine:
     Handles VLOOKUP, nested IFs, complex calculations, and circular references.
     """
     
-    def __init__(self):
+    def __init__(self, trace_timing: bool = False):
         self.lookup_tables: Dict[str, Any] = {}
-        self.cell_values: Dict[str, Any] = {}
+        self._lookup_indexes: Dict[str, Tuple[Dict[str, list], List[Tuple[int, Any]], List[list]]] = {}
+        self._vl_cache: OrderedDict[Tuple[str, Any, int, bool], Any] = OrderedDict()
+        
+        # Cell values live only in _cell_arr, where compiled formulas read
+        # them by position; cell_values is a read-only view by reference,
+        # and cells change through execute_complex_formula inputs
+        self._cell_idx: Dict[str, int] = {}
+        self._cell_arr: List[Any] = []
+        self.cell_values: Mapping[str, Any] = _CellValues(self._cell_idx, self._cell_arr)
         self.formulas: Dict[str, str] = {}
+        self._compiled: Dict[str, CodeType] = {}
+        self._kernels: Dict[str, Optional[Tuple[Callable, Tuple[int, ...]]]] = {}
+        
+        # Globals for compiled formulas, including lookup columns inlined
+        # by specialized conversion; builtins are limited to _SAFE_BUILTINS
+        self._formula_globals: Dict[str, Any] = {
+            '__builtins__': _SAFE_BUILTINS, 'self': self, '_cells': self._cell_arr
+        }
+        self._inlined_lookups: Dict[Tuple[str, int], str] = {}
         self.calculation_cache: Dict[str, Any] = {}
         self.circular_refs: List[str] = []
         
+        # Cells the caller has set through inputs; formula results never
+        # replace them
+        self._input_cells: Set[str] = set()
+        
+        # Time each execute_complex_formula call; off unless a trace is wanted
+        self._trace_timing = trace_timing
+        
+        # Dependency graph: cells each formula reads, formulas reading each
+        # cell, the (cell, formula) pairs where a formula reads a formula on
+        # its own sheet, the formulas reading each formula, and a
+        # topological formula order
+        self._deps: Dict[str, Set[str]] = {}
+        self._deps_reverse: Dict[str, Set[str]] = {}
+        self._formula_links: Dict[str, List[Tuple[str, str]]] = {}
+        self._dependents: Dict[str, List[str]] = {}
+        self._topo_order: List[str] = []
+        self._circular: Set[str] = set()
+        self._graph_stale = False
+        
+        # Formulas registered since the graph was last built
+        self._changed_formulas: Set[str] = set()
+        
     def load_lookup_tables(self, tables: Dict[str, Any]):
         """Load VLOOKUP tables from Excel Data2 and pricing sheets"""
         self.lookup_tables = tables
+        self._vl_cache.clear()
+        self.calculation_cache.clear()
+        
+        # Columns inlined from the previous tables must not be folded again
+        for name in self._inlined_lookups.values():
+            del self._formula_globals[name]
+        self._inlined_lookups.clear()
+        
+        # Index every table once so lookups never scan rows
+        self._lookup_indexes = {
+            table_ref: self._build_lookup_index(table['data'])
+            for table_ref, table in tables.items()
+            if 'data' in table
+        }
+        
+    def _build_lookup_index(self, rows: List[list]) -> Tuple[Dict[str, list], List[Tuple[int, Any]], List[list]]:
+        """
+        Index table rows by first column: a dict of its text for exact
+        matches (first match wins, as in Excel), and keys in Excel's sort
+        order with their rows for approximate matches.
+        """
+        exact = {}
+        for row in rows:
+            if row:
+                exact.setdefault(str(row[0]), row)
+                
+        ordered = sorted((row for row in rows if row), key=lambda row: _excel_order_key(row[0]))
+        return exact, [_excel_order_key(row[0]) for row in ordered], ordered
         
     def convert_vlookup(self, lookup_value: Any, table_ref: str, 
                        col_index: int, exact_match: bool = False) -> Any:
@@ -39,63 +438,388 @@ class ExcelFormulaEngine:
         Convert Excel VLOOKUP to Python lookup.
         Handles composite keys and approximate matches.
         """
+        if isinstance(lookup_value, (list, tuple)):
+            value_key = tuple(str(v) for v in lookup_value)
+        else:
+            # Exact matches compare text, approximate ones the type group too
+            value_key = (str(lookup_value), _excel_order_key(lookup_value)[0])
+        cache_key = (table_ref, value_key, col_index, exact_match)
+        
+        # Least recently used results are evicted past _VL_CACHE_SIZE
+        result = self._vl_cache.get(cache_key, _MISSING)
+        if result is _MISSING:
+            result = self._vl_cache[cache_key] = self._lookup(
+                lookup_value, table_ref, col_index, exact_match
+            )
+            if len(self._vl_cache) > _VL_CACHE_SIZE:
+                self._vl_cache.popitem(last=False)
+        else:
+            self._vl_cache.move_to_end(cache_key)
+        return result
+        
+    def _lookup(self, lookup_value: Any, table_ref: str,
+                col_index: int, exact_match: bool) -> Any:
+        """Uncached convert_vlookup"""
         if table_ref not in self.lookup_tables:
             raise ValueError(f"Lookup table {table_ref} not found")
             
-        table = self.lookup_tables[table_ref]
+        index = self._lookup_indexes.get(table_ref)
+        if index is None:
+            # Table added after load_lookup_tables
+            index = self._build_lookup_index(self.lookup_tables[table_ref]['data'])
+            self._lookup_indexes[table_ref] = index
+        exact, sorted_keys, sorted_rows = index
         
         # Handle composite keys (e.g., "T13&\" \"&N13&\" \"&R13")
-        if isinstance(lookup_value, list):
+        if isinstance(lookup_value, (list, tuple)):
             lookup_value = " ".join(str(v) for v in lookup_value)
+        if exact_match:
+            row = exact.get(str(lookup_value))
+        else:
+            # Approximate match (Excel default): largest key <= lookup value
+            # of the same type, so numeric tiers compare as numbers
+            key = _excel_order_key(lookup_value)
+            pos = bisect.bisect_right(sorted_keys, key)
+            row = sorted_rows[pos - 1] if pos and sorted_keys[pos - 1][0] == key[0] else None
             
-        # Search for value
-        for row in table['data']:
-            if exact_match:
-                if str(row[0]) == str(lookup_value):
-                    return row[col_index - 1]
-            else:
-                # Approximate match (Excel default)
-                if str(row[0]) <= str(lookup_value):
-                    return row[col_index - 1]
-                    
-        return None  # #N/A in Excel
+        if row is None:
+            return None  # #N/A in Excel
+        return row[col_index - 1]
         
-    def convert_formula_to_python(self, excel_formula: str) -> str:
+    def convert_formula_to_python(self, excel_formula: str,
+                                  lookup_tables: Optional[Dict[str, Any]] = None,
+                                  constants: Optional[Dict[str, Any]] = None) -> str:
         """
         Convert Excel formula to executable Python code.
         Preserves all logic including nested IFs and error handling.
+        
+        Passing lookup_tables and/or constants specializes the code: known
+        cell constants are folded in as literals and exact-match VLOOKUPs
+        against the given tables become direct dict lookups. Specialized
+        code is only valid for this engine instance.
         """
-        # Remove leading = sign
-        formula = excel_formula.strip('=')
-        
-        # Convert Excel functions to Python
-        conversions = {
-            r'IF\s*\(': 'self._if(',
-            r'IFERROR\s*\(': 'self._iferror(',
-            r'VLOOKUP\s*\(': 'self._vlookup(',
-            r'SUM\s*\(': 'self._sum(',
-            r'ROUND\s*\(': 'round(',
-            r'&': '+',  # String concatenation
-            r'""': '""',  # Empty string
-        }
+        # Formulas filled down a column differ only in their cell references,
+        # so translate the reference-free template once and substitute back
+        refs = []
         
-        for pattern, replacement in conversions.items():
-            formula = re.sub(pattern, replacement, formula, flags=re.IGNORECASE)
+        def _to_placeholder(match) -> str:
+            refs.append(match.group(1))
+            return f"\x00{len(refs) - 1}\x00"
             
-        # Convert cell references to lookups
-        formula = re.sub(r'([A-Z]+[0-9]+)', r'self.get_cell("\1")', formula)
+        def _from_placeholder(match) -> str:
+            ref = refs[int(match.group(1))]
+            if constants and ref in constants:
+                return repr(constants[ref])
+            return f'self.get_cell("{ref}")'
+            
+        template = _CELL_REF_PATTERN.sub(_to_placeholder, excel_formula)
+        python_template = _translate_formula_template(template)
+        formula = _REF_PLACEHOLDER_PATTERN.sub(_from_placeholder, python_template)
         
+        if lookup_tables:
+            formula = self._inline_vlookups(formula, lookup_tables)
+            
         return formula
         
+    def _inline_vlookups(self, formula: str, lookup_tables: Dict[str, Any]) -> str:
+        """Replace exact-match VLOOKUPs on known tables with dict lookups"""
+        
+        call = 'self._vlookup('
+        parts = []
+        pos = 0
+        
+        while True:
+            start = formula.find(call, pos)
+            if start < 0:
+                break
+            args, end = _split_call_args(formula, start + len(call))
+            
+            table, col, exact = None, '', False
+            if args is not None and len(args) == 4:
+                table_ref = args[1].strip().strip('\'"')
+                table = lookup_tables.get(table_ref)
+                col = args[2].strip()
+                exact = args[3].strip().upper() in ('FALSE', '0')
+                
+            if not (table and 'data' in table and col.isdigit() and int(col) > 0 and exact):
+                # Leave the call as is; nested calls are still visited
+                parts.append(formula[pos:start + len(call)])
+                pos = start + len(call)
+                continue
+                
+            column = self._inline_lookup_column(table_ref, int(col), table['data'])
+            key = self._inline_vlookups(args[0].strip(), lookup_tables)
+            
+            try:
+                # Literal key: fold the whole lookup to its value
+                replacement = repr(self._formula_globals[column].get(str(ast.literal_eval(key))))
+            except (ValueError, SyntaxError):
+                replacement = f"{column}.get(str({key}))"
+                
+            parts.append(formula[pos:start])
+            parts.append(replacement)
+            pos = end
+            
+        parts.append(formula[pos:])
+        return ''.join(parts)
+        
+    def _inline_lookup_column(self, table_ref: str, col_index: int,
+                              rows: List[list]) -> str:
+        """Materialize one lookup column as a key -> value dict global"""
+        
+        key = (table_ref, col_index)
+        if key not in self._inlined_lookups:
+            name = f"_vlookup_{len(self._inlined_lookups)}"
+            column = {}
+            for row in rows:
+                # First match wins, as in Excel
+                if row and str(row[0]) not in column:
+                    column[str(row[0])] = row[col_index - 1] if col_index <= len(row) else None
+            self._formula_globals[name] = column
+            self._inlined_lookups[key] = name
+            
+        return self._inlined_lookups[key]
+        
+    def register_formula(self, formula_name: str, python_code: str):
+        """Register converted formula code; it is compiled on first use"""
+        self.formulas[formula_name] = python_code
+        self._compiled.pop(formula_name, None)
+        self._kernels.pop(formula_name, None)
+        self._changed_formulas.add(formula_name)
+        self._graph_stale = True
+        
+    def register_cells(self, names: List[str]):
+        """Assign array positions to cells ahead of compiling formulas"""
+        for name in names:
+            self._cell_index(name)
+            
+    def _cell_index(self, cell_ref: str) -> int:
+        """Array position of a cell, growing the array for new cells"""
+        index = self._cell_idx.get(cell_ref)
+        if index is None:
+            index = self._cell_idx[cell_ref] = len(self._cell_arr)
+            self._cell_arr.append(0)  # Empty cells read as 0, as in Excel
+        return index
+        
+    def _set_cell(self, cell_ref: str, value: Any):
+        """Write a cell value"""
+        self._cell_arr[self._cell_index(cell_ref)] = value
+            
+    def compile_formula(self, formula_name: str) -> CodeType:
+        """
+        Compile a registered formula once so evaluation skips parsing.
+        get_cell calls are compiled to direct reads of the cell array; the
+        stored source keeps them so it stays valid for any engine.
+        """
+        code = self._compiled.get(formula_name)
+        if code is None:
+            source = _GET_CELL_PATTERN.sub(
+                lambda match: f"_cells[{self._cell_index(match.group(1))}]",
+                self.formulas[formula_name]
+            )
+            code = _compile_formula_source(source)
+            self._compiled[formula_name] = code
+        return code
+        
+    def compile_kernel(self, formula_name: str) -> Optional[Tuple[Callable, Tuple[int, ...]]]:
+        """
+        Generate the numeric kernel for a registered formula, if it has one,
+        with the array positions of the cells it reads.
+        """
+        if formula_name not in self._kernels:
+            generated = FormulaCodegen.generate(self.formulas[formula_name])
+            if generated is not None:
+                kernel, refs = generated
+                generated = kernel, tuple(self._cell_index(ref) for ref in refs)
+            self._kernels[formula_name] = generated
+        return self._kernels[formula_name]
+        
+    def compile_all(self) -> int:
+        """
+        Compile every registered formula ahead of the first calculation.
+        Returns the number of formulas that do not compile or fail
+        check_formula_code; those raise when executed, as before.
+        """
+        failed = 0
+        for formula_name in self.formulas:
+            try:
+                self.compile_formula(formula_name)
+                self.compile_kernel(formula_name)
+            except (SyntaxError, UnsafeFormulaError) as e:
+                failed += 1
+                logger.warning(f"Formula {formula_name} does not compile: {e}")
+                
+        self._build_dependency_graph()
+        return failed
+        
+    def warmup(self) -> int:
+        """
+        Compile every formula and, with Numba, JIT every kernel so no
+        calculation pays for compilation. Returns compile_all's count.
+        """
+        start_ns = time.perf_counter_ns()
+        failed = self.compile_all()
+        
+        if njit is not None:
+            for formula_name, kernel in self._kernels.items():
+                if kernel is None:
+                    continue
+                compiled, indices = kernel
+                try:
+                    compiled(np.zeros(len(indices)))
+                except ZeroDivisionError:
+                    pass  # Compiled; zeros are just a bad input for this formula
+                except Exception as e:
+                    # Numba could not type the kernel; the formula uses eval
+                    logger.warning(f"Kernel for {formula_name} does not compile: {e}")
+                    self._kernels[formula_name] = None
+                    
+        elapsed_ms = (time.perf_counter_ns() - start_ns) / 1_000_000
+        logger.info(f"Warmed up {len(self.formulas)} formulas in {elapsed_ms:.1f}ms")
+        return failed
+        
+    def _build_dependency_graph(self):
+        """
+        Link formulas through the cells they read and write and order them
+        topologically. Formulas on a cycle are recorded in circular_refs and
+        cannot be executed.
+        """
+        self._deps = {
+            formula_name: set(_GET_CELL_PATTERN.findall(python_code))
+            for formula_name, python_code in self.formulas.items()
+        }
+        self._deps_reverse = {}
+        for formula_name, cells in self._deps.items():
+            for cell in cells:
+                self._deps_reverse.setdefault(cell, set()).add(formula_name)
+                
+        # Cell references are relative to the formula's sheet, so a formula
+        # keyed "Sheet!B1" only feeds formulas of that sheet reading B1
+        self._formula_links = {}
+        self._dependents = {}
+        for formula_name, cells in self._deps.items():
+            sheet_prefix = formula_name[:formula_name.rfind('!') + 1]
+            links = []
+            for cell in cells:
+                precedent = sheet_prefix + cell
+                if precedent in self.formulas:
+                    links.append((cell, precedent))
+                    self._dependents.setdefault(precedent, []).append(formula_name)
+            self._formula_links[formula_name] = links
+            
+        # Components come out precedents first; acyclic ones give the order
+        order = []
+        circular = []
+        for component in self._strongly_connected():
+            formula_name = component[0]
+            if len(component) > 1 or formula_name in self._formula_precedents(formula_name):
+                circular.extend(component)
+            else:
+                order.append(formula_name)
+                
+        self._topo_order = order
+        self._circular = set(circular)
+        self.circular_refs = circular
+        if circular:
+            logger.warning(f"Circular references in {len(circular)} formulas")
+        self._graph_stale = False
+        
+        # Results derived from re-registered formulas are stale
+        self._invalidate_formulas(self._changed_formulas)
+        self._changed_formulas.clear()
+        
+    def _formula_precedents(self, formula_name: str) -> List[str]:
+        """Formulas writing the cells a formula reads"""
+        return [precedent for _, precedent in self._formula_links[formula_name]]
+        
+    def _strongly_connected(self) -> List[List[str]]:
+        """
+        Strongly connected components of the formula graph (Tarjan's
+        algorithm, iterative). Each component is emitted after the
+        components it depends on.
+        """
+        index: Dict[str, int] = {}
+        lowlink: Dict[str, int] = {}
+        stack: List[str] = []
+        on_stack: Set[str] = set()
+        components = []
+        
+        for root in self.formulas:
+            if root in index:
+                continue
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self._formula_precedents(root)))]
+            
+            while work:
+                node, precedents = work[-1]
+                for precedent in precedents:
+                    if precedent not in index:
+                        index[precedent] = lowlink[precedent] = len(index)
+                        stack.append(precedent)
+                        on_stack.add(precedent)
+                        work.append((precedent, iter(self._formula_precedents(precedent))))
+                        break
+                    if precedent in on_stack:
+                        lowlink[node] = min(lowlink[node], index[precedent])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+                    if lowlink[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(component)
+                        
+        return components
+        
+    def _invalidate(self, cells) -> None:
+        """Drop cached results of every formula depending on the given cells"""
+        self._invalidate_formulas([
+            formula_name
+            for cell in cells
+            for formula_name in self._deps_reverse.get(cell, ())
+        ])
+        
+    def _invalidate_formulas(self, formula_names) -> None:
+        """Drop cached results of the given formulas and their dependents"""
+        pending = list(formula_names)
+        seen = set()
+        while pending:
+            formula_name = pending.pop()
+            if formula_name not in seen:
+                seen.add(formula_name)
+                self.calculation_cache.pop(formula_name, None)
+                pending.extend(self._dependents.get(formula_name, ()))
+                    
+    def _precedents(self, formula_name: str) -> Set[str]:
+        """Formulas the given formula transitively depends on, itself included"""
+        needed = {formula_name}
+        pending = [formula_name]
+        while pending:
+            for _, precedent in self._formula_links.get(pending.pop(), ()):
+                if precedent not in needed:
+                    needed.add(precedent)
+                    pending.append(precedent)
+        return needed
+        
     def _if(self, condition: bool, true_value: Any, false_value: Any) -> Any:
         """Excel IF function"""
         return true_value if condition else false_value
         
-    def _iferror(self, expression: Any, error_value: Any) -> Any:
-        """Excel IFERROR function"""
+    def _iferror(self, expression: Callable[[], Any], error_value: Any) -> Any:
+        """Excel IFERROR function; expression is a callable evaluated here"""
         try:
-            return expression
-        except:
+            # Code converted before IFERROR was deferred passes the value
+            return expression() if callable(expression) else expression
+        except (ArithmeticError, ValueError, LookupError, TypeError):
             return error_value
             
     def _vlookup(self, lookup_value: Any, table_array: str, 
@@ -105,41 +829,38 @@ class ExcelFormulaEngine:
         
     def _sum(self, *args) -> float:
         """Excel SUM function"""
-        total = 0
-        for arg in args:
-            if isinstance(arg, (list, tuple)):
-                total += sum(float(v) for v in arg if v is not None)
-            elif arg is not None:
-                total += float(arg)
-        return total
+        return _excel_sum(*args)
         
     def get_cell(self, cell_ref: str) -> Any:
         """Get value from cell reference"""
-        return self.cell_values.get(cell_ref, 0)
+        index = self._cell_idx.get(cell_ref)
+        return 0 if index is None else self._cell_arr[index]
         
     def calculate_with_margins(self, base_cost: float, margin1: float, margin2: float) -> float:
         """
         Apply 2-tier margin calculation as per Excel:
         final_price = base_cost / (1 - margin1) / (1 - margin2)
         """
-        if margin1 >= 1 or margin2 >= 1:
-            raise ValueError("Margin cannot be 100% or greater")
-            
-        price_after_margin1 = base_cost / (1 - margin1)
-        final_price = price_after_margin1 / (1 - margin2)
-        
-        return round(final_price, 2)
+        return quantize_cents(base_cost * _margin_k(margin1, margin2))
         
     def execute_complex_formula(self, formula_name: str, inputs: Dict[str, Any]) -> Dict[str, Any]:
         """
         Execute complex Excel formulas like the ones in Interior Measure J618.
         Returns detailed calculation breakdown.
+        
+        Formula results are cached between calls and feed the formulas
+        reading their cell on the same sheet, unless the caller has set that
+        cell through inputs; only formulas depending on changed inputs are
+        recomputed, so cell changes must come in through inputs.
         """
+        if self._graph_stale:
+            self._build_dependency_graph()
+            
         # Update cell values with inputs
-        self.cell_values.update(inputs)
-        
-        # Clear cache for fresh calculation
-        self.calculation_cache.clear()
+        for cell_ref, value in inputs.items():
+            self._set_cell(cell_ref, value)
+        self._input_cells.update(inputs)
+        self._invalidate(inputs)
         
         result = {
             'formula_name': formula_name,
@@ -150,17 +871,30 @@ class ExcelFormulaEngine:
             'execution_time_ms': None
         }
         
-        start_time = datetime.now()
+        if self._trace_timing:
+            start_ns = time.perf_counter_ns()
         
         try:
             # Get formula definition
             if formula_name not in self.formulas:
                 raise ValueError(f"Formula {formula_name} not found")
                 
-            formula = self.formulas[formula_name]
+            # Evaluate stale precedents first, in dependency order
+            needed = self._precedents(formula_name)
+            if not needed.isdisjoint(self._circular):
+                raise CircularReferenceError(
+                    f"Formula {formula_name} depends on a circular reference"
+                )
+            plan = [name for name in self._topo_order if name in needed]
             
-            # Execute formula with tracing
-            result['final_result'] = eval(formula)
+            for name in plan:
+                if name not in self.calculation_cache:
+                    value = self._evaluate_linked(name)
+                    self.calculation_cache[name] = value
+                    if _DEBUG:
+                        logger.debug(f"Recalculated {name} = {value!r}")
+                    
+            result['final_result'] = self.calculation_cache[formula_name]
             
             # Add intermediate values from calculation
             result['intermediate_values'] = {
@@ -175,21 +909,121 @@ class ExcelFormulaEngine:
             result['final_result'] = None
             
         # Calculate execution time
-        execution_time = (datetime.now() - start_time).total_seconds() * 1000
-        result['execution_time_ms'] = round(execution_time, 2)
+        if self._trace_timing:
+            result['execution_time_ms'] = round((time.perf_counter_ns() - start_ns) / 1_000_000, 2)
         
         return result
         
+    def _evaluate_linked(self, formula_name: str) -> Any:
+        """
+        Evaluate a formula with the cells it reads from formulas on its own
+        sheet set to their cached results. Cell values are shared by all
+        sheets, so those cells are restored afterwards.
+        """
+        saved = []
+        for cell, precedent in self._formula_links[formula_name]:
+            if cell not in self._input_cells:
+                saved.append((cell, self.get_cell(cell)))
+                self._set_cell(cell, self.calculation_cache[precedent])
+                
+        try:
+            return self._evaluate(formula_name)
+        finally:
+            for cell, value in saved:
+                self._set_cell(cell, value)
+                    
+    def _evaluate(self, formula_name: str) -> Any:
+        """Evaluate one formula against the current cell values"""
+        kernel = self.compile_kernel(formula_name)
+        if kernel is not None:
+            compiled, indices = kernel
+            cells = self._cell_arr
+            values = [cells[index] for index in indices]
+            
+            # Kernels only take numbers, and JIT kernels only floats; other
+            # values go through eval
+            if all(isinstance(value, float if njit is not None else (int, float)) for value in values):
+                try:
+                    return self._run_kernel(compiled, values)
+                except ZeroDivisionError:
+                    raise
+                except Exception as e:
+                    # Not JIT compiled by warmup and Numba cannot type it
+                    logger.warning(f"Kernel for {formula_name} failed, using eval: {e}")
+                    self._kernels[formula_name] = None
+                    
+        return eval(self.compile_formula(formula_name), self._formula_globals)
+        
+    def _run_kernel(self, kernel: Callable, values: List[Any]) -> Any:
+        """Call a formula kernel with the values of the cells it reads"""
+        if njit is None:
+            return kernel(values)
+        return kernel(np.array(values, dtype=np.float64))
+        
     def validate_against_excel(self, excel_result: float, our_result: float, 
                              tolerance: float = 0.01) -> bool:
         """Validate our calculations match Excel within tolerance"""
-        if excel_result == 0:
-            return our_result == 0
-            
-        difference = abs(excel_result - our_result)
-        percentage_diff = difference / abs(excel_result)
+        # Relative to Excel's value, so a zero result must match exactly
+        return abs(excel_result - our_result) <= tolerance * abs(excel_result)
         
-        return percentage_diff <= tolerance
+    def validate_batch_against_excel(self, excel_results: np.ndarray, our_results: np.ndarray,
+                                     tolerance: float = 0.01) -> np.ndarray:
+        """Vectorized validate_against_excel; returns a boolean array"""
+        return np.isclose(our_results, excel_results, rtol=tolerance, atol=0.0)
+
+
+# Exterior paint price per gallon, from Data2
+PAINT_COST_PER_GALLON = 45
+
+# Batch exterior bid column expressions, valid for both numexpr and NumPy
+_PAINT_GALLONS_EXPR = "where(vinyl != 0, body_sqft / 400.0, body_sqft / 350.0) + trim_linear_ft / 100.0"
+_MARGIN_TOTAL_EXPR = "subtotal * (1.0 / ((1 - margin1) * (1 - margin2)))"
+
+# Exterior bid measurements and their defaults, in unpacking order
+_EXTERIOR_FIELDS = (
+    ('body_sqft', 0),
+    ('trim_linear_ft', 0),
+    ('vinyl_positive', False),
+    ('margin1', 0.25),
+    ('margin2', 0.15),
+)
+
+
+def _exterior_core(body_sqft: float, trim_linear_ft: float, vinyl_positive: bool,
+                   margin1: float, margin2: float, labor_rate: float) -> Tuple[float, ...]:
+    """
+    Exterior bid arithmetic on plain numbers. Returns body, trim and total
+    paint gallons, body and trim paint cost, labor hours, material and labor
+    cost, subtotal and the rounded total with margins.
+    """
+    # Apply business rules: higher coverage for vinyl, else standard
+    paint_divider = 400 if vinyl_positive else 350
+    
+    # Calculate paint gallons needed
+    body_gallons = body_sqft / paint_divider
+    trim_gallons = trim_linear_ft / 100  # 100 linear ft per gallon
+    paint_gallons = body_gallons + trim_gallons
+    
+    # Calculate costs
+    body_cost = body_gallons * PAINT_COST_PER_GALLON
+    trim_cost = trim_gallons * PAINT_COST_PER_GALLON
+    material_cost = paint_gallons * PAINT_COST_PER_GALLON
+    labor_hours = body_sqft / 200  # 200 sqft per hour
+    labor_cost = labor_hours * labor_rate
+    
+    # Apply margins, as calculate_with_margins does
+    subtotal = material_cost + labor_cost
+    total = quantize_cents(subtotal * _margin_k(margin1, margin2))
+    
+    return (body_gallons, trim_gallons, paint_gallons, body_cost, trim_cost,
+            labor_hours, material_cost, labor_cost, subtotal, total)
+
+
+def _evaluate_columns(expression: str, columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """Evaluate a column expression in one fused pass with numexpr, else with NumPy"""
+    if numexpr is not None:
+        return numexpr.evaluate(expression, local_dict=columns)
+    return eval(expression, {'__builtins__': {}, 'where': np.where}, columns)
 
 
 class BARTCalculationEngine:
@@ -204,59 +1038,97 @@ class BARTCalculationEngine:
     def calculate_exterior_bid(self, measurements: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate complete exterior painting bid"""
         
-        # Extract measurements
-        body_sqft = measurements.get('body_sqft', 0)
-        trim_linear_ft = measurements.get('trim_linear_ft', 0)
-        
-        # Apply business rules
-        if measurements.get('vinyl_positive'):
-            paint_divider = 400  # Higher coverage for vinyl
-        else:
-            paint_divider = 350  # Standard coverage
-            
-        # Calculate paint gallons needed
-        body_gallons = body_sqft / paint_divider
-        trim_gallons = trim_linear_ft / 100  # 100 linear ft per gallon
+        # Extract measurements once
+        get = measurements.get
+        body_sqft, trim_linear_ft, vinyl_positive, margin1, margin2 = (
+            get(field, default) for field, default in _EXTERIOR_FIELDS
+        )
         
         # Get pricing from lookup tables
         labor_rate = self.formula_engine.convert_vlookup(
             'exterior_labor', 'labor_rates', 2, True
         )
-        paint_cost_per_gallon = 45  # From Data2
         
-        # Calculate costs
-        material_cost = (body_gallons + trim_gallons) * paint_cost_per_gallon
-        labor_hours = body_sqft / 200  # 200 sqft per hour
-        labor_cost = labor_hours * labor_rate
-        
-        # Apply margins
-        subtotal = material_cost + labor_cost
-        total = self.formula_engine.calculate_with_margins(
-            subtotal, 
-            measurements.get('margin1', 0.25),
-            measurements.get('margin2', 0.15)
+        (body_gallons, trim_gallons, paint_gallons, body_cost, trim_cost,
+         labor_hours, material_cost, labor_cost, subtotal, total) = _exterior_core(
+            body_sqft, trim_linear_ft, vinyl_positive, margin1, margin2, labor_rate
         )
         
         return {
             'measurements': measurements,
             'calculations': {
-                'paint_gallons': round(body_gallons + trim_gallons, 1),
+                'paint_gallons': round(paint_gallons, 1),
                 'labor_hours': round(labor_hours, 1),
-                'material_cost': round(material_cost, 2),
-                'labor_cost': round(labor_cost, 2),
-                'subtotal': round(subtotal, 2),
-                'total': round(total, 2)
+                'material_cost': quantize_cents(material_cost),
+                'labor_cost': quantize_cents(labor_cost),
+                'subtotal': quantize_cents(subtotal),
+                'total': total
             },
             'breakdown': {
                 'body': {
                     'sqft': body_sqft,
                     'gallons': round(body_gallons, 1),
-                    'cost': round(body_gallons * paint_cost_per_gallon, 2)
+                    'cost': quantize_cents(body_cost)
                 },
                 'trim': {
                     'linear_ft': trim_linear_ft,
                     'gallons': round(trim_gallons, 1),
-                    'cost': round(trim_gallons * paint_cost_per_gallon, 2)
+                    'cost': quantize_cents(trim_cost)
                 }
             }
-        }
\ No newline at end of file
+        }
+        
+    def calculate_exterior_bid_batch(self, measurements_df: "pd.DataFrame") -> "pd.DataFrame":
+        """
+        Calculate exterior bids for every row of measurements at once.
+        Returns one row per bid with the columns of calculate_exterior_bid's
+        'calculations'; use .to_dict('records') for per-bid dicts.
+        """
+        # pandas is only loaded by callers that batch
+        import pandas as pd
+        
+        def column(name: str, default: float) -> np.ndarray:
+            if name not in measurements_df:
+                return np.full(len(measurements_df), default, dtype=np.float64)
+            return measurements_df[name].fillna(default).to_numpy(dtype=np.float64)
+            
+        body_sqft = column('body_sqft', 0)
+        trim_linear_ft = column('trim_linear_ft', 0)
+        margin1 = column('margin1', 0.25)
+        margin2 = column('margin2', 0.15)
+        
+        if (margin1 >= 1).any() or (margin2 >= 1).any():
+            raise ValueError("Margin cannot be 100% or greater")
+            
+        # Same business rules as calculate_exterior_bid, one column at a time
+        paint_gallons = _evaluate_columns(_PAINT_GALLONS_EXPR, {
+            'vinyl': column('vinyl_positive', 0),
+            'body_sqft': body_sqft,
+            'trim_linear_ft': trim_linear_ft
+        })
+        
+        # Resolved once for the whole batch
+        labor_rate = self.formula_engine.convert_vlookup(
+            'exterior_labor', 'labor_rates', 2, True
+        )
+        material_cost = paint_gallons * PAINT_COST_PER_GALLON
+        labor_hours = body_sqft / 200
+        labor_cost = labor_hours * labor_rate
+        subtotal = material_cost + labor_cost
+        total = _evaluate_columns(_MARGIN_TOTAL_EXPR, {
+            'subtotal': subtotal, 'margin1': margin1, 'margin2': margin2
+        })
+        
+        def rounded(values: np.ndarray, digits: int) -> List[float]:
+            # np.round scales by 10**digits first and misrounds half-cent
+            # ties that round() gets right
+            return [round(value, digits) for value in values.tolist()]
+            
+        return pd.DataFrame({
+            'paint_gallons': rounded(paint_gallons, 1),
+            'labor_hours': rounded(labor_hours, 1),
+            'material_cost': rounded(material_cost, 2),
+            'labor_cost': rounded(labor_cost, 2),
+            'subtotal': rounded(subtotal, 2),
+            'total': rounded(total, 2)
+        }, index=measurements_df.index)
\ No newline at end of file
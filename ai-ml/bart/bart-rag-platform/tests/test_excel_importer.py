@@ -0,0 +1,74 @@
+"""
+Tests for the BART Excel importer.
+Run from the project root with: python -m unittest discover tests
+"""
+
+import os
+import tempfile
+import unittest
+
+import openpyxl
+
+from src.bid_tool.services.excel_importer import BARTExcelImporter
+
+
+def _write_workbook(path):
+    """Workbook with a measurement form and hidden pricing and note sheets"""
+    workbook = openpyxl.Workbook()
+    form = workbook.active
+    form.title = "Ext Measure"
+    form["A1"] = "Body sqft"
+    form["B2"] = '=VLOOKUP(A2,Data2!$A$1:$C$10,3,FALSE)'
+    
+    pricing = workbook.create_sheet("Pricing Table")
+    pricing.sheet_state = 'hidden'
+    pricing.append([None, None, None])
+    pricing.append(["Type", "Item", "Price"])
+    pricing.append(["Paint", "Body", 45])
+    pricing.append([None, None, None])
+    pricing.append(["Paint", "Trim", 50.5])
+    
+    notes = workbook.create_sheet("Notes")
+    notes.sheet_state = 'hidden'
+    notes.append(["Reminder"])
+    notes.append(["Call back"])
+    
+    workbook.save(path)
+
+
+class TableExtractionTests(unittest.TestCase):
+    """Hidden pricing sheets become lookup tables"""
+    
+    @classmethod
+    def setUpClass(cls):
+        handle, cls.path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(handle)
+        _write_workbook(cls.path)
+        cls.result = BARTExcelImporter(cls.path).import_all()
+        
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.path)
+        
+    def test_pricing_sheet_is_extracted_as_table(self):
+        self.assertEqual(self.result['lookups']['pricing'], {
+            'sheet': 'Pricing Table',
+            'headers': ['Type', 'Item', 'Price'],
+            'data': [['Paint', 'Body', 45], ['Paint', 'Trim', 50.5]],
+            'composite_key': '{Type} {Item}'
+        })
+        
+    def test_other_hidden_sheets_are_not_tables(self):
+        self.assertNotIn('notes', self.result['lookups'])
+        
+    def test_vlookup_references_are_recorded(self):
+        lookups = [
+            lookup for lookup in self.result['lookups'].values()
+            if 'Ext Measure!B2' in lookup.get('references', ())
+        ]
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(lookups[0]['columns_used'], [3])
+
+
+if __name__ == '__main__':
+    unittest.main()
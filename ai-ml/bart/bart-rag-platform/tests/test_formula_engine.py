@@ -0,0 +1,330 @@
+"""
+Tests for the Excel formula engine.
+Run from the project root with: python -m unittest discover tests
+"""
+
+import random
+import unittest
+from unittest import mock
+
+from src.bid_tool.services import formula_engine
+from src.bid_tool.services.formula_engine import (
+    BARTCalculationEngine, ExcelFormulaEngine, FormulaCodegen, UnsafeFormulaError
+)
+
+
+def _engine_with(formulas, tables=None, **convert_kwargs):
+    """Engine with the given Excel formulas converted and registered"""
+    engine = ExcelFormulaEngine()
+    engine.load_lookup_tables(tables or {})
+    for formula_name, excel_formula in formulas.items():
+        engine.register_formula(
+            formula_name, engine.convert_formula_to_python(excel_formula, **convert_kwargs)
+        )
+    engine.compile_all()
+    return engine
+
+
+class LookupReloadTests(unittest.TestCase):
+    """Reloading lookup tables replaces every derived lookup"""
+    
+    def test_reconverted_formula_uses_reloaded_inlined_table(self):
+        engine = ExcelFormulaEngine()
+        formula = '=VLOOKUP(B1,"t",2,FALSE)'
+        
+        for price in (1, 100):
+            engine.load_lookup_tables({'t': {'data': [['a', price]]}})
+            engine.register_formula('S!A1', engine.convert_formula_to_python(
+                formula, lookup_tables=engine.lookup_tables
+            ))
+            result = engine.execute_complex_formula('S!A1', {'B1': 'a'})
+            self.assertEqual(result['final_result'], price)
+            
+    def test_reloaded_table_is_not_served_from_result_cache(self):
+        formula = '=VLOOKUP(B1,"t",2,0)'
+        engine = _engine_with({'S!A1': formula}, {'t': {'data': [['a', 1]]}})
+        self.assertEqual(engine.execute_complex_formula('S!A1', {'B1': 'a'})['final_result'], 1)
+        
+        engine.load_lookup_tables({'t': {'data': [['a', 999]]}})
+        self.assertEqual(engine.execute_complex_formula('S!A1', {})['final_result'], 999)
+        
+    def test_lookup_cache_is_bounded(self):
+        engine = ExcelFormulaEngine()
+        engine.load_lookup_tables({'t': {'data': [[str(key), key] for key in range(3000)]}})
+        for key in range(3000):
+            self.assertEqual(engine.convert_vlookup(str(key), 't', 2, True), key)
+        self.assertEqual(len(engine._vl_cache), formula_engine._VL_CACHE_SIZE)
+        
+    def test_composite_key_lookups_keep_no_per_table_state(self):
+        engine = ExcelFormulaEngine()
+        engine.load_lookup_tables({'t': {'data': [['a 1', 'hit']]}})
+        self.assertEqual(engine.convert_vlookup(['a', 1], 't', 2, True), 'hit')
+        for key in range(5000):
+            self.assertIsNone(engine.convert_vlookup(['b', key], 't', 2, True))
+        self.assertEqual([len(part) for part in engine._lookup_indexes['t']], [1, 1, 1])
+        self.assertEqual(len(engine._vl_cache), formula_engine._VL_CACHE_SIZE)
+
+
+class ApproximateLookupTests(unittest.TestCase):
+    """Approximate VLOOKUP finds the largest key not above the value"""
+    
+    def setUp(self):
+        self.engine = ExcelFormulaEngine()
+        self.engine.load_lookup_tables({'tiers': {'data': [
+            [0, 'base'], [100, 'small'], [500, 'medium'], [1000, 'large'], ['B', 'text']
+        ]}})
+        
+    def test_numeric_tiers_compare_as_numbers(self):
+        for value, tier in ((50, 'base'), (99, 'base'), (100, 'small'), (150, 'small'),
+                            (499.5, 'small'), (999, 'medium'), (25000, 'large')):
+            self.assertEqual(self.engine.convert_vlookup(value, 'tiers', 2), tier)
+            
+    def test_value_below_first_tier_is_not_found(self):
+        self.assertIsNone(self.engine.convert_vlookup(-1, 'tiers', 2))
+        
+    def test_text_only_matches_text_keys(self):
+        self.assertEqual(self.engine.convert_vlookup('C', 'tiers', 2), 'text')
+        self.assertIsNone(self.engine.convert_vlookup('A', 'tiers', 2))
+        self.assertIsNone(self.engine.convert_vlookup('150', 'tiers', 2))
+        
+    def test_formula_with_numeric_tiers(self):
+        engine = _engine_with(
+            {'S!A1': '=VLOOKUP(B1,"tiers",2,1)'},
+            {'tiers': {'data': [[0, 1.0], [100, 0.9], [500, 0.8], [1000, 0.7]]}}
+        )
+        self.assertEqual(engine.execute_complex_formula('S!A1', {'B1': 150})['final_result'], 0.9)
+        self.assertEqual(engine.execute_complex_formula('S!A1', {'B1': 50})['final_result'], 1.0)
+
+
+class DependencyGraphTests(unittest.TestCase):
+    """Formulas feed only formulas reading their cell on the same sheet"""
+    
+    def test_chained_formulas_on_one_sheet(self):
+        engine = _engine_with({'S!B1': '=A1*2', 'S!C1': '=B1+1'})
+        self.assertEqual(engine.execute_complex_formula('S!C1', {'A1': 5})['final_result'], 11)
+        self.assertEqual(engine.execute_complex_formula('S!C1', {'A1': 1})['final_result'], 3)
+        
+    def test_formula_on_other_sheet_does_not_overwrite_input(self):
+        engine = _engine_with({'S1!A1': '=B1*2', 'S2!C1': '=A1+1'})
+        result = engine.execute_complex_formula('S2!C1', {'A1': 10})
+        self.assertEqual(result['final_result'], 11)
+        
+        # Evaluating the other sheet's formula leaves the input in place
+        engine.execute_complex_formula('S1!A1', {'B1': 3})
+        self.assertEqual(engine.execute_complex_formula('S2!C1', {})['final_result'], 11)
+        self.assertEqual(engine.cell_values['A1'], 10)
+        
+    def test_input_cell_is_not_replaced_by_formula(self):
+        engine = _engine_with({'S!A1': '=B1*2', 'S!C1': '=A1+1'})
+        result = engine.execute_complex_formula('S!C1', {'A1': 10})
+        self.assertEqual(result['final_result'], 11)
+        
+    def test_reregistered_formula_invalidates_dependents(self):
+        engine = _engine_with({'S!B1': '=A1*2', 'S!C1': '=B1+1'})
+        self.assertEqual(engine.execute_complex_formula('S!C1', {'A1': 5})['final_result'], 11)
+        
+        engine.register_formula('S!B1', engine.convert_formula_to_python('=A1*3'))
+        self.assertEqual(engine.execute_complex_formula('S!C1', {})['final_result'], 16)
+        
+    def test_new_formula_invalidates_readers_of_its_cell(self):
+        engine = _engine_with({'S!C1': '=B1+1'})
+        self.assertEqual(engine.execute_complex_formula('S!C1', {'A1': 5})['final_result'], 1)
+        
+        engine.register_formula('S!B1', engine.convert_formula_to_python('=A1*2'))
+        self.assertEqual(engine.execute_complex_formula('S!C1', {})['final_result'], 11)
+        
+    def test_same_cell_on_other_sheets_is_not_circular(self):
+        engine = _engine_with({'Ext!A1': '=B1+1', 'Int!B1': '=A1*2', 'Int!C1': '=A1+5'})
+        self.assertEqual(engine.circular_refs, [])
+        result = engine.execute_complex_formula('Int!C1', {'A1': 1})
+        self.assertEqual(result['final_result'], 6)
+        
+    def test_self_reference_is_circular(self):
+        engine = _engine_with({'S!A1': '=A1+1'})
+        self.assertEqual(engine.circular_refs, ['S!A1'])
+        self.assertIn('error', engine.execute_complex_formula('S!A1', {}))
+
+
+class IfErrorTests(unittest.TestCase):
+    """IFERROR evaluates its expression inside the handler"""
+    
+    def test_errors_in_expression_return_fallback(self):
+        engine = _engine_with({
+            'S!A1': '=IFERROR(B1/C1,-1)',
+            'S!A2': '=IFERROR(VLOOKUP(B1,"missing",2,0),"n/a")',
+            'S!A3': '=IFERROR(B1+D1,0)'
+        })
+        inputs = {'B1': 6, 'C1': 0, 'D1': 'text'}
+        self.assertEqual(engine.execute_complex_formula('S!A1', inputs)['final_result'], -1)
+        self.assertEqual(engine.execute_complex_formula('S!A2', {})['final_result'], 'n/a')
+        self.assertEqual(engine.execute_complex_formula('S!A3', {})['final_result'], 0)
+        
+    def test_value_without_error_is_returned(self):
+        engine = _engine_with({'S!A1': '=IFERROR(B1/C1,-1)'})
+        self.assertEqual(engine.execute_complex_formula('S!A1', {'B1': 6, 'C1': 3})['final_result'], 2)
+        
+    def test_plain_values_from_older_conversions_are_accepted(self):
+        engine = ExcelFormulaEngine()
+        self.assertEqual(engine._iferror(5, -1), 5)
+        
+    def test_only_calculation_errors_are_caught(self):
+        engine = ExcelFormulaEngine()
+        
+        def interrupted():
+            raise KeyboardInterrupt
+            
+        with self.assertRaises(KeyboardInterrupt):
+            engine._iferror(interrupted, -1)
+
+
+class CellStoreTests(unittest.TestCase):
+    """cell_values is a read-only view of the cells formulas read"""
+    
+    def test_inputs_are_visible_through_cell_values(self):
+        engine = _engine_with({'S!B1': '=A1*2'})
+        engine.execute_complex_formula('S!B1', {'A1': 4, 'base_labor': 7})
+        self.assertEqual(engine.cell_values['A1'], 4)
+        self.assertEqual(engine.get_cell('base_labor'), 7)
+        self.assertEqual(engine.get_cell('Z99'), 0)
+        self.assertNotIn('Z99', engine.cell_values)
+        
+    def test_cell_values_cannot_be_written(self):
+        engine = ExcelFormulaEngine()
+        with self.assertRaises(TypeError):
+            engine.cell_values['A1'] = 1
+
+
+class FormulaSandboxTests(unittest.TestCase):
+    """Converted formulas cannot reach anything but the engine helpers"""
+    
+    def test_attribute_escape_is_rejected(self):
+        formula = '=self.get_cell.__func__.__globals__["__builtins__"]["__import__"]("os").getpid()'
+        engine = _engine_with({'S!A1': formula})
+        self.assertEqual(engine.compile_all(), 1)
+        result = engine.execute_complex_formula('S!A1', {})
+        self.assertIsNone(result['final_result'])
+        self.assertIn('Formula code uses', result['error'])
+        
+    def test_dunder_names_are_rejected(self):
+        engine = ExcelFormulaEngine()
+        engine.register_formula('S!A1', '__import__("os")')
+        with self.assertRaises(UnsafeFormulaError):
+            engine.compile_formula('S!A1')
+            
+    def test_helper_calls_and_inlined_lookups_are_allowed(self):
+        engine = _engine_with(
+            {'S!A1': '=IFERROR(VLOOKUP(B1,"t",2,FALSE)+SUM(C1,2),0)', 'S!A2': '=IF(B2>0,ROUND(B2,1),0)'},
+            {'t': {'data': [['a', 5]]}}, lookup_tables={'t': {'data': [['a', 5]]}}
+        )
+        self.assertEqual(engine.compile_all(), 0)
+        self.assertEqual(engine.execute_complex_formula('S!A1', {'B1': 'a', 'C1': 1})['final_result'], 8)
+        self.assertEqual(engine.execute_complex_formula('S!A2', {'B2': 1.26})['final_result'], 1.3)
+
+
+def _python_njit(**options):
+    """Stand-in for numba.njit; kernels take float64 arrays and return Python scalars"""
+    def decorate(kernel):
+        return lambda cells: kernel(cells.tolist())
+    return decorate
+
+
+def _untypable_njit(**options):
+    """Stand-in for numba.njit whose kernels fail to type on first call"""
+    def decorate(kernel):
+        def compiled(cells):
+            raise TypeError("cannot determine Numba type")
+        return compiled
+    return decorate
+
+
+class KernelFallbackTests(unittest.TestCase):
+    """Formulas without a usable kernel still evaluate through eval"""
+    
+    def test_operators_numba_cannot_type_get_no_kernel(self):
+        self.assertIsNone(FormulaCodegen.generate('self.get_cell("A1") ^ 2'))
+        self.assertIsNone(FormulaCodegen.generate('round(self.get_cell("A1"), self.get_cell("B1"))'))
+        self.assertIsNotNone(FormulaCodegen.generate('round(self.get_cell("A1"), 2)'))
+        
+    def test_text_cells_use_eval(self):
+        # Kernels get a float64 array whenever Numba is installed
+        with mock.patch.object(formula_engine, 'njit', _python_njit):
+            engine = _engine_with({'S!C1': '=A1+B1'})
+            self.assertIsNotNone(engine.compile_kernel('S!C1'))
+            result = engine.execute_complex_formula('S!C1', {'A1': 'ab', 'B1': 'cd'})
+        self.assertEqual(result['final_result'], 'abcd')
+        
+    def test_untypable_kernel_falls_back_in_warmup(self):
+        with mock.patch.object(formula_engine, 'njit', _untypable_njit):
+            engine = _engine_with({'S!B1': '=A1*2'})
+            engine.warmup()
+            self.assertIsNone(engine.compile_kernel('S!B1'))
+            result = engine.execute_complex_formula('S!B1', {'A1': 4})
+        self.assertEqual(result['final_result'], 8)
+        
+    def test_untypable_kernel_falls_back_on_first_call(self):
+        with mock.patch.object(formula_engine, 'njit', _untypable_njit):
+            engine = _engine_with({'S!B1': '=A1*2'})
+            result = engine.execute_complex_formula('S!B1', {'A1': 4.0})
+            self.assertIsNone(engine.compile_kernel('S!B1'))
+        self.assertEqual(result['final_result'], 8.0)
+        
+    def test_if_only_evaluates_chosen_branch_on_eval_path(self):
+        engine = _engine_with({'S!D1': '=IF(A1>0,B1/A1,C1)'})
+        self.assertIsNotNone(engine.compile_kernel('S!D1'))
+        
+        # Text in C1 keeps the formula off its kernel
+        result = engine.execute_complex_formula('S!D1', {'A1': 0, 'B1': 5, 'C1': 'none'})
+        self.assertEqual(result['final_result'], 'none')
+        result = engine.execute_complex_formula('S!D1', {'C1': 0})
+        self.assertEqual(result['final_result'], 0)
+        
+    def test_jit_kernels_only_for_float_cells_and_known_result_types(self):
+        with mock.patch.object(formula_engine, 'njit', _python_njit):
+            self.assertIsNone(FormulaCodegen.generate('self._if(self.get_cell("A1")>0,self.get_cell("A1"),0)'))
+            self.assertIsNone(FormulaCodegen.generate('self._if(self.get_cell("A1")>0,2,3)**2'))
+            self.assertIsNotNone(FormulaCodegen.generate('self._if(self.get_cell("A1")>0,self.get_cell("A1"),0.0)'))
+            
+            engine = _engine_with({'S!B1': '=A1*2'})
+            for value in (4, 4.0):
+                result = engine.execute_complex_formula('S!B1', {'A1': value})['final_result']
+                self.assertEqual((result, type(result)), (value * 2, type(value)))
+
+
+class ExteriorBidBatchTests(unittest.TestCase):
+    """Batch exterior bids match calculate_exterior_bid row for row"""
+    
+    def setUp(self):
+        formula_engine = ExcelFormulaEngine()
+        formula_engine.load_lookup_tables({'labor_rates': {'data': [['exterior_labor', 65]]}})
+        self.engine = BARTCalculationEngine(formula_engine)
+        
+    def test_batch_matches_single_bids(self):
+        import pandas as pd
+        
+        rng = random.Random(7)
+        fields = ('body_sqft', 'trim_linear_ft', 'vinyl_positive', 'margin1', 'margin2')
+        rows = []
+        for _ in range(2000):
+            rows.append({
+                'body_sqft': rng.choice([None, 0, rng.randint(1, 5000), rng.uniform(0, 5000)]),
+                'trim_linear_ft': rng.choice([None, 0, rng.randint(1, 800), rng.uniform(0, 800)]),
+                'vinyl_positive': rng.choice([None, True, False]),
+                'margin1': rng.choice([None, 0, round(rng.uniform(0, 0.5), 2), rng.uniform(0, 0.9)]),
+                'margin2': rng.choice([None, 0, round(rng.uniform(0, 0.5), 2), rng.uniform(0, 0.9)])
+            })
+            
+        batch = self.engine.calculate_exterior_bid_batch(pd.DataFrame(rows, columns=fields))
+        for row, batch_row in zip(rows, batch.to_dict('records')):
+            # Missing measurements take calculate_exterior_bid's defaults
+            measurements = {field: value for field, value in row.items() if value is not None}
+            self.assertEqual(batch_row, self.engine.calculate_exterior_bid(measurements)['calculations'])
+            
+    def test_batch_rejects_full_margin(self):
+        import pandas as pd
+        
+        with self.assertRaises(ValueError):
+            self.engine.calculate_exterior_bid_batch(pd.DataFrame({'body_sqft': [100], 'margin1': [1.0]}))
+
+
+if __name__ == '__main__':
+    unittest.main()